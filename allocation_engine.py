@@ -0,0 +1,1048 @@
+import os
+import re
+import sys
+import argparse
+import hashlib
+import importlib.util
+import json
+import multiprocessing
+import time
+import tracemalloc
+import posixpath
+import zipfile
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook, load_workbook
+
+from moderator_config import CACHE_DIR, CONFIG_FILE, load_config
+
+REQUIRED_COLUMNS = ["Register Number", "Name of the student", "Schedule Id", "Schedule Name", "Email of the student", "Total Marks", "Exam Appearance Status", "Evaluated By", "Evaluator Id", "Script Id", "Cycle"]
+
+# Fastest first; openpyxl is always installed and is the fallback
+EXCEL_READ_ENGINES = ["calamine", "openpyxl"]
+EXCEL_WRITE_ENGINES = ["xlsxwriter", "openpyxl"]
+ENGINE_MODULES = {"calamine": "python_calamine", "xlsxwriter": "xlsxwriter", "openpyxl": "openpyxl"}
+
+def is_engine_available(engine):
+    if importlib.util.find_spec(ENGINE_MODULES[engine]) is None:
+        return False
+    # pandas only accepts engine="calamine" from 2.2 onwards
+    if engine == "calamine":
+        return tuple(int(part) for part in pd.__version__.split(".")[:2]) >= (2, 2)
+    return True
+
+def resolve_excel_engine(requested, candidates):
+    if requested != "auto":
+        if requested in candidates and is_engine_available(requested):
+            return requested
+        print(f"Excel engine '{requested}' is not available, picking one automatically.")
+    return next((engine for engine in candidates if is_engine_available(engine)), "openpyxl")
+
+# Anything without a recognised extension is treated as an Excel workbook
+INPUT_FORMATS = {".xlsx": "xlsx", ".csv": "csv", ".parquet": "parquet"}
+OUTPUT_FORMATS = ["xlsx", "csv", "parquet"]
+# How much of sorted_data goes into MasterAllocationData
+MASTER_SHEET_PROFILES = ["full", "selected", "none"]
+
+def detect_input_format(file_path):
+    return INPUT_FORMATS.get(os.path.splitext(file_path)[1].lower(), "xlsx")
+
+def resolve_output_format(requested):
+    if requested not in OUTPUT_FORMATS:
+        print(f"Output format '{requested}' is not supported, writing xlsx.")
+        return "xlsx"
+    if requested == "parquet" and importlib.util.find_spec("pyarrow") is None:
+        print("Parquet output needs pyarrow, writing xlsx.")
+        return "xlsx"
+    return requested
+
+def resolve_master_sheet(requested):
+    if requested not in MASTER_SHEET_PROFILES:
+        print(f"MasterAllocationData profile '{requested}' is not supported, writing the full sheet.")
+        return "full"
+    return requested
+
+def get_io_settings(config, individual_files):
+    return {
+        "individual_files": individual_files,
+        "read_engine": resolve_excel_engine(config["excel_read_engine"], EXCEL_READ_ENGINES),
+        "write_engine": resolve_excel_engine(config["excel_write_engine"], EXCEL_WRITE_ENGINES),
+        "output_format": resolve_output_format(config["output_format"]),
+        "input_columns": config["input_columns"],
+        "master_sheet": resolve_master_sheet(config["master_sheet"]),
+        "master_sheet_columns": list(config["master_sheet_columns"]),
+        # 0 turns the parsed-frame cache off
+        "cache_max_bytes": max(int(config["cache_max_mb"]), 0) * 1024 * 1024,
+        "trace_memory": bool(config["trace_memory"]),
+        "split_by_schedule": bool(config["split_by_schedule"])
+    }
+
+def local_name(tag):
+    # Transitional and strict workbooks use different namespaces for the same tags
+    return tag.rsplit('}', 1)[-1]
+
+def find_first_sheet_path(archive):
+    workbook = ET.fromstring(archive.read("xl/workbook.xml"))
+    sheet = next(element for element in workbook.iter() if local_name(element.tag) == "sheet")
+    relation_id = next(value for key, value in sheet.attrib.items() if local_name(key) == "id")
+    relations = ET.fromstring(archive.read("xl/_rels/workbook.xml.rels"))
+    target = next(element.get("Target") for element in relations if element.get("Id") == relation_id)
+    if target.startswith("/"):
+        return target.lstrip("/")
+    return posixpath.normpath(posixpath.join("xl", target))
+
+def read_shared_strings(archive, indices):
+    # Stops at the highest index the header uses instead of loading the whole table
+    wanted = set(indices)
+    strings = {}
+    if not wanted or "xl/sharedStrings.xml" not in archive.namelist():
+        return strings
+    last = max(wanted)
+    with archive.open("xl/sharedStrings.xml") as table:
+        index = 0
+        for _, element in ET.iterparse(table):
+            if local_name(element.tag) != "si":
+                continue
+            if index in wanted:
+                # Rich text splits a string into runs; phonetic hints (rPh) are not part of it
+                parts = []
+                for child in element:
+                    if local_name(child.tag) == "t":
+                        parts.append(child.text or "")
+                    elif local_name(child.tag) == "r":
+                        parts.extend(text.text or "" for text in child if local_name(text.tag) == "t")
+                strings[index] = "".join(parts)
+            element.clear()
+            if index >= last:
+                break
+            index += 1
+    return strings
+
+def read_xlsx_header(file_path):
+    # Only the first <row> of the first sheet is parsed, plus the shared strings it
+    # points at, so the probe costs the same on a 100-row and a 1M-row export
+    with zipfile.ZipFile(file_path) as archive:
+        cells = []
+        with archive.open(find_first_sheet_path(archive)) as sheet:
+            for _, element in ET.iterparse(sheet):
+                name = local_name(element.tag)
+                if name == "c":
+                    cell_type = element.get("t", "n")
+                    if cell_type == "inlineStr":
+                        value = "".join(text.text or "" for text in element.iter() if local_name(text.tag) == "t")
+                    else:
+                        value = next((child.text for child in element if local_name(child.tag) == "v"), None)
+                    cells.append((cell_type, value))
+                elif name == "row":
+                    break
+        shared = read_shared_strings(archive, [int(value) for cell_type, value in cells if cell_type == "s" and value is not None])
+
+    header = []
+    for cell_type, value in cells:
+        if cell_type == "s" and value is not None:
+            value = shared.get(int(value))
+        if value is not None and value != "":
+            header.append(value)
+    return header
+
+def read_header_columns(file_path):
+    input_format = detect_input_format(file_path)
+    if input_format == "csv":
+        return [str(col) for col in pd.read_csv(file_path, nrows=0).columns]
+    if input_format == "parquet":
+        import pyarrow.parquet as pq
+        # The schema lives in the footer, so no row groups are read
+        return pq.read_schema(file_path).names
+
+    try:
+        return read_xlsx_header(file_path)
+    except (KeyError, StopIteration, ValueError, ET.ParseError, zipfile.BadZipFile):
+        # Layouts the direct reader does not know go through openpyxl, which has
+        # to load the shared string table before it yields the first row
+        pass
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        worksheet = workbook.worksheets[0]
+        header = next(worksheet.iter_rows(min_row=1, max_row=1, values_only=True), ())
+    finally:
+        workbook.close()
+    return [str(cell) for cell in header if cell is not None]
+
+def validate_input_file(file1_path):
+    def get_missing_columns(file_path):
+        try:
+            columns = read_header_columns(file_path)
+            return [col for col in REQUIRED_COLUMNS if col not in columns]
+        except Exception as e:
+            return REQUIRED_COLUMNS
+
+    missing_values = get_missing_columns(file1_path)
+
+    valid_file = not missing_values
+    missing_columns = {
+        file1_path: missing_values if not valid_file else []
+    }
+
+    return valid_file, missing_columns
+
+def load_input_file(file_path, read_engine="openpyxl", input_columns="all"):
+    # The header probe rejects malformed exports before paying for a full parse.
+    # calamine parses quickly enough that the column check after the read is
+    # cheaper than probing first, so workbooks it reads skip the probe.
+    input_format = detect_input_format(file_path)
+    if not (input_format == "xlsx" and read_engine == "calamine"):
+        valid_file, missing_columns = validate_input_file(file_path)
+        if not valid_file:
+            return None, missing_columns
+
+    # "required" parses only the columns the allocation consumes; "all" keeps every
+    # exported column so it is echoed into MasterAllocationData
+    usecols = None
+    if input_columns == "required":
+        usecols = lambda col: col in REQUIRED_COLUMNS
+
+    try:
+        if input_format == "csv":
+            data = pd.read_csv(file_path, dtype={'Registration Number': str}, usecols=usecols)
+        elif input_format == "parquet":
+            data = pd.read_parquet(file_path, columns=REQUIRED_COLUMNS if usecols else None)
+        else:
+            data = pd.read_excel(file_path, dtype={'Registration Number': str}, engine=read_engine, usecols=usecols)
+    except Exception as e:
+        print(f"Failed to read {file_path}: {e}")
+        return None, {file_path: REQUIRED_COLUMNS}
+
+    missing_values = [col for col in REQUIRED_COLUMNS if col not in data.columns]
+    if missing_values:
+        return None, {file_path: missing_values}
+
+    return data, {file_path: []}
+
+# Bump when parsing changes so frames cached by older builds are not reused
+CACHE_VERSION = 1
+
+def get_cache_key(file_path, *parts):
+    # Size and mtime stand in for a content hash: hashing would mean reading the
+    # whole workbook, which is most of what the cache is meant to save
+    stat = os.stat(file_path)
+    fingerprint = [CACHE_VERSION, os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns, *parts]
+    return hashlib.sha1("|".join(str(part) for part in fingerprint).encode()).hexdigest()
+
+def read_cached_frame(key):
+    cache_file = os.path.join(CACHE_DIR, f"{key}.pkl")
+    try:
+        data = pd.read_pickle(cache_file)
+        # Touching the entry keeps it at the young end of the LRU order
+        os.utime(cache_file)
+    except Exception:
+        return None
+    return data
+
+def write_cached_frame(key, data, max_bytes):
+    cache_file = os.path.join(CACHE_DIR, f"{key}.pkl")
+    # Workers may cache in parallel, so write aside and swap in atomically
+    temp_file = f"{cache_file}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        data.to_pickle(temp_file)
+        os.replace(temp_file, cache_file)
+    except Exception as e:
+        print(f"Failed to cache {key}: {e}")
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+        return
+    evict_cache(max_bytes)
+
+def evict_cache(max_bytes):
+    entries = []
+    with os.scandir(CACHE_DIR) as scan:
+        for entry in scan:
+            if entry.name.endswith(".pkl"):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+    total_bytes = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total_bytes <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        total_bytes -= size
+
+def load_input_file_cached(file_path, io_settings):
+    read_engine, input_columns = io_settings["read_engine"], io_settings["input_columns"]
+    max_bytes = io_settings["cache_max_bytes"]
+    if not max_bytes:
+        return load_input_file(file_path, read_engine, input_columns)
+
+    try:
+        key = get_cache_key(file_path, read_engine, input_columns)
+    except OSError:
+        # Moved, deleted or unreadable: the uncached read reports it as invalid
+        return load_input_file(file_path, read_engine, input_columns)
+    data = read_cached_frame(key)
+    if data is not None:
+        return data, {file_path: []}
+
+    data, missing_columns = load_input_file(file_path, read_engine, input_columns)
+    if data is not None:
+        write_cached_frame(key, data, max_bytes)
+    return data, missing_columns
+
+def get_category_labels(top_selected_booklets, middle_selected_booklets, bottom_selected_booklets):
+    return [f'Top {top_selected_booklets}%', f'Middle {middle_selected_booklets}%', f'Bottom {bottom_selected_booklets}%']
+
+def assign_scoring_categories(sorted_data, top_selected_booklets, middle_selected_booklets, bottom_selected_booklets):
+    # sorted_data must already be ordered by evaluator, then marks descending, so a
+    # row's position inside its evaluator's block decides its category in one pass
+    evaluator_groups = sorted_data.groupby('Evaluated By', sort=False, observed=True)
+    position = evaluator_groups.cumcount().to_numpy()
+    group_size = evaluator_groups['Evaluated By'].transform('size').to_numpy()
+
+    # Integer form of math.ceil(size * percent / 100)
+    top_count = -(-group_size * top_selected_booklets // 100)
+    bottom_count = -(-group_size * bottom_selected_booklets // 100)
+
+    # Codes 0/1/2 are Top/Middle/Bottom; Bottom wins where the rounded-up top and
+    # bottom slices overlap, and rows without an evaluator stay uncategorised (-1)
+    category_codes = np.where(position >= group_size - bottom_count, 2, np.where(position < top_count, 0, 1)).astype(np.int8)
+    category_codes[sorted_data['Evaluated By'].isna().to_numpy()] = -1
+
+    sorted_data['Scoring Category'] = pd.Categorical.from_codes(category_codes, categories=get_category_labels(
+        top_selected_booklets,
+        middle_selected_booklets,
+        bottom_selected_booklets
+    ))
+    return sorted_data
+
+def select_for_moderation(sorted_data, category_labels, pick_percents, seed=42):
+    # Every (evaluator, category) pair is one group id, so all picks for all
+    # groups come from a single shuffle instead of one DataFrame.sample per group
+    evaluator_codes, evaluators = pd.factorize(sorted_data['Evaluated By'])
+    category_codes = pd.Categorical(sorted_data['Scoring Category'], categories=category_labels).codes
+    valid_rows = np.flatnonzero((evaluator_codes >= 0) & (category_codes >= 0))
+    group_ids = evaluator_codes[valid_rows] * len(category_labels) + category_codes[valid_rows]
+
+    # Pick counts are a % of *total scripts for this evaluator*, rounded up
+    evaluator_sizes = np.bincount(evaluator_codes[valid_rows], minlength=len(evaluators))
+    pick_counts = -(-evaluator_sizes[:, None] * np.asarray(pick_percents)[None, :] // 100)
+
+    # Random tie-breaker within each group; a fixed seed makes runs reproducible
+    rng = np.random.default_rng(seed)
+    order = np.lexsort((rng.random(len(valid_rows)), group_ids))
+    ordered_groups = group_ids[order]
+    rank_in_group = np.arange(len(order)) - np.searchsorted(ordered_groups, ordered_groups, side='left')
+
+    # Only pick as many as available in that category
+    selected = np.zeros(len(sorted_data), dtype=bool)
+    selected[valid_rows[order]] = rank_in_group < pick_counts.ravel()[ordered_groups]
+
+    # Kept as a boolean while processing; to_output_frame restores the labels
+    sorted_data['Selected for Moderation'] = selected
+    return sorted_data
+
+def to_output_frame(sorted_data):
+    return sorted_data.assign(**{
+        'Selected for Moderation': np.where(sorted_data['Selected for Moderation'], 'Selected', 'Not Selected')
+    })
+
+def get_booklet_split(allocation_settings):
+    return [allocation_settings[key] for key in ('top_selected_booklets', 'middle_selected_booklets', 'bottom_selected_booklets')]
+
+def get_sampling_settings(allocation_settings):
+    # moderator_seed only feeds build_moderator_mapping
+    return {key: value for key, value in allocation_settings.items() if key != 'moderator_seed'}
+
+def find_invalid_cycles(df):
+    return df.loc[~df['Cycle'].isin(['primary', '-']), 'Cycle'].unique().tolist()
+
+def filter_primary_rows(df):
+    df = df[df['Cycle'] == 'primary'].copy()
+    # One small integer code per row instead of a repeated Python string; the
+    # lexically ordered categories keep the sort below identical to sorting strings
+    df['Evaluated By'] = df['Evaluated By'].astype('category')
+    return df
+
+def sort_by_evaluator(df):
+    return df.sort_values(by=['Evaluated By', 'Total Marks'], ascending=[True, False]).reset_index(drop=True)
+
+def categorize_allocation(df, top_selected_booklets, middle_selected_booklets, bottom_selected_booklets):
+    invalid_cycle_values = find_invalid_cycles(df)
+    if invalid_cycle_values:
+        return invalid_cycle_values, None
+
+    sorted_data = sort_by_evaluator(filter_primary_rows(df))
+    sorted_data = assign_scoring_categories(
+        sorted_data,
+        top_selected_booklets,
+        middle_selected_booklets,
+        bottom_selected_booklets
+    )
+    return [], sorted_data
+
+def sample_allocation(
+        sorted_data,
+        top_selected_booklets,
+        middle_selected_booklets,
+        bottom_selected_booklets,
+        top_picked_booklets,
+        middle_picked_booklets,
+        bottom_picked_booklets,
+        sampling_seed=42
+    ):
+    print(f'Total Scripts: {len(sorted_data)}')
+    print(f'Total Evaluators: {sorted_data['Evaluated By'].nunique()}')
+
+    return select_for_moderation(
+        sorted_data,
+        get_category_labels(top_selected_booklets, middle_selected_booklets, bottom_selected_booklets),
+        [top_picked_booklets, middle_picked_booklets, bottom_picked_booklets],
+        seed=sampling_seed
+    )
+
+def count_evaluator_scripts(file_path, io_settings):
+    # The what-if preview only needs how many primary scripts each evaluator has;
+    # files the run would skip contribute nothing
+    data, _ = load_input_file_cached(file_path, io_settings)
+    if data is None:
+        return None
+    valid_cycles = data['Cycle'].isin(['primary', '-'])
+    if io_settings["split_by_schedule"]:
+        # Each schedule is categorised on its own and skipped on its own, so an
+        # evaluator gets one count per schedule they marked in
+        data = data[valid_cycles.groupby(data['Schedule Id'], dropna=False).transform('all')]
+        primary = data[data['Cycle'] == 'primary']
+        return primary.groupby(['Schedule Id', 'Evaluated By']).size().droplevel(0)
+    if not valid_cycles.all():
+        return None
+    return data.loc[data['Cycle'] == 'primary', 'Evaluated By'].value_counts()
+
+def preview_selection_counts(evaluator_counts, booklet_split, pick_percents):
+    # Same rounding as assign_scoring_categories and select_for_moderation, worked
+    # out from one count per evaluator and file instead of one row per script
+    counts = pd.concat(evaluator_counts)
+    sizes = counts.to_numpy(dtype=np.int64)
+    top_percent, _, bottom_percent = booklet_split
+
+    # Bottom wins where the rounded-up top and bottom slices overlap
+    bottom_count = np.minimum(-(-sizes * bottom_percent // 100), sizes)
+    top_count = np.minimum(-(-sizes * top_percent // 100), sizes - bottom_count)
+    category_counts = np.column_stack([top_count, sizes - top_count - bottom_count, bottom_count])
+
+    pick_counts = -(-sizes[:, None] * np.asarray(pick_percents)[None, :] // 100)
+    selected = np.minimum(pick_counts, category_counts).sum(axis=1)
+
+    preview = pd.DataFrame({
+        'Scripts': sizes,
+        'Top': category_counts[:, 0],
+        'Middle': category_counts[:, 1],
+        'Bottom': category_counts[:, 2],
+        'Selected': selected
+    }, index=counts.index.astype(object))
+    # Evaluators who mark in several files are shown once, with their totals
+    return preview.groupby(level=0).sum()
+
+def build_allocation_summary(sorted_data):
+    # One grouped pass keyed on the categorical codes categorisation already
+    # assigned, so no string labels are hashed. Min/Max/Mean Marks cover the
+    # selected scripts; the Category columns are the mark range that fell into
+    # each category, i.e. the thresholds that were applied.
+    evaluators = sorted_data['Evaluated By'].astype('category').cat
+    categories = sorted_data['Scoring Category'].cat
+    evaluator_codes = evaluators.codes.to_numpy().astype(np.int64)
+    category_codes = categories.codes.to_numpy()
+    valid_rows = (evaluator_codes >= 0) & (category_codes >= 0)
+
+    marks = sorted_data['Total Marks'].to_numpy(dtype=float, na_value=np.nan)
+    selected = sorted_data['Selected for Moderation'].to_numpy()
+    group_stats = pd.DataFrame({
+        'group': (evaluator_codes * len(categories.categories) + category_codes)[valid_rows],
+        'marks': marks[valid_rows],
+        'selected': selected[valid_rows],
+        'selected_marks': np.where(selected, marks, np.nan)[valid_rows]
+    }).groupby('group').agg(**{
+        'Min Marks': ('selected_marks', 'min'),
+        'Max Marks': ('selected_marks', 'max'),
+        'Mean Marks': ('selected_marks', 'mean'),
+        'Scripts': ('marks', 'size'),
+        'Selected': ('selected', 'sum'),
+        'Category Min Marks': ('marks', 'min'),
+        'Category Max Marks': ('marks', 'max')
+    })
+
+    group_ids = group_stats.index.to_numpy()
+    allocation_summary_df = pd.DataFrame({
+        'Evaluated By': evaluators.categories.take(group_ids // len(categories.categories)).astype(object),
+        'Scoring Category': categories.categories.take(group_ids % len(categories.categories)).astype(object)
+    })
+    allocation_summary_df[group_stats.columns] = group_stats.to_numpy()
+    allocation_summary_df['Mean Marks'] = allocation_summary_df['Mean Marks'].round(2)
+    allocation_summary_df = allocation_summary_df.astype({'Scripts': np.int64, 'Selected': np.int64})
+
+    # Plain labels keep the summary sorted alphabetically, as before
+    return allocation_summary_df.sort_values(['Evaluated By', 'Scoring Category'], kind='stable', ignore_index=True)
+
+def build_allocation_outputs(sorted_data):
+    selected_filter = sorted_data[sorted_data['Selected for Moderation']]
+    allocation_summary_df = build_allocation_summary(sorted_data)
+
+    bulk_allocation_df = selected_filter[['Schedule Id', 'Email of the student', 'Moderator']].astype({'Moderator': object})
+    bulk_allocation_df.rename(columns={
+        'Schedule Id': 'Test Id',
+        'Email of the student': 'User Id',
+        'Moderator': 'Evaluator Ids'
+    }, inplace=True)
+
+    return bulk_allocation_df, allocation_summary_df
+
+def get_output_path(base_path, output_format, sheet_name):
+    # xlsx keeps every sheet in one workbook; csv and parquet get one file per sheet
+    if output_format == "xlsx":
+        return f'{base_path}.xlsx'
+    return f'{base_path}_{sheet_name}.{output_format}'
+
+def write_sheets(base_path, sheets, io_settings):
+    output_format = io_settings["output_format"]
+    if output_format == "xlsx":
+        # Streaming whole rows is about twice as fast as DataFrame.to_excel, which
+        # formats every cell on its way through
+        workbook = StreamingWorkbook(get_output_path(base_path, "xlsx", None), io_settings["write_engine"])
+        for sheet_name, sheet_df in sheets.items():
+            workbook.append_frame(sheet_name, workbook.add_sheet(sheet_name), sheet_df)
+        workbook.save()
+        return
+
+    for sheet_name, sheet_df in sheets.items():
+        output_file = get_output_path(base_path, output_format, sheet_name)
+        if output_format == "csv":
+            sheet_df.to_csv(output_file, index=False)
+        else:
+            # pyarrow rejects object columns that mix numbers and text, which
+            # Excel exports often have, so those are written as text
+            text_columns = sheet_df.select_dtypes(include="object").columns
+            sheet_df.astype({column: "string" for column in text_columns}).to_parquet(output_file, index=False)
+
+def build_master_sheet(sorted_data, io_settings):
+    # MasterAllocationData dwarfs the other sheets; the profile can keep only the
+    # selected rows, only some columns, or drop the sheet altogether
+    if io_settings["master_sheet"] == "none":
+        return None
+    if io_settings["master_sheet"] == "selected":
+        sorted_data = sorted_data[sorted_data['Selected for Moderation']]
+    if io_settings["master_sheet_columns"]:
+        # Columns this export does not have are skipped rather than failing the file
+        sorted_data = sorted_data[[col for col in io_settings["master_sheet_columns"] if col in sorted_data.columns]]
+    if 'Selected for Moderation' in sorted_data.columns:
+        return to_output_frame(sorted_data)
+    return sorted_data
+
+def write_allocation_file(base_path, bulk_allocation_df, sorted_data, allocation_summary_df, io_settings):
+    sheets = {'BulkAllocation': bulk_allocation_df}
+    master_sheet = build_master_sheet(sorted_data, io_settings)
+    if master_sheet is not None:
+        sheets['MasterAllocationData'] = master_sheet
+    sheets['AllocationSummary'] = allocation_summary_df
+    write_sheets(base_path, sheets, io_settings)
+
+class StreamingWorkbook:
+    # Row-at-a-time workbook that flushes rows to disk as they are appended, using
+    # xlsxwriter's constant_memory mode or openpyxl's write-only mode
+    def __init__(self, output_file, engine="openpyxl"):
+        self.output_file = output_file
+        self.engine = engine
+        self.next_row = {}
+        if engine == "xlsxwriter":
+            import xlsxwriter
+            # Same datetime format DataFrame.to_excel uses; xlsxwriter has none by default
+            self.workbook = xlsxwriter.Workbook(output_file, {"constant_memory": True, "default_date_format": "yyyy-mm-dd hh:mm:ss"})
+        else:
+            self.workbook = Workbook(write_only=True)
+
+    def add_sheet(self, sheet_name):
+        if self.engine == "xlsxwriter":
+            worksheet = self.workbook.add_worksheet(sheet_name)
+        else:
+            worksheet = self.workbook.create_sheet(sheet_name)
+        self.next_row[sheet_name] = 0
+        return worksheet
+
+    def append_row(self, sheet_name, worksheet, row):
+        if self.engine == "xlsxwriter":
+            worksheet.write_row(self.next_row[sheet_name], 0, row)
+        else:
+            worksheet.append(row)
+        self.next_row[sheet_name] += 1
+
+    def append_frame(self, sheet_name, worksheet, frame, header=True):
+        if header:
+            self.append_row(sheet_name, worksheet, [str(col) for col in frame.columns])
+        # Blank cells instead of NaN, matching DataFrame.to_excel
+        values = frame.astype(object).where(frame.notna(), None)
+        for row in values.itertuples(index=False, name=None):
+            self.append_row(sheet_name, worksheet, row)
+
+    def save(self):
+        if self.engine == "xlsxwriter":
+            self.workbook.close()
+        else:
+            self.workbook.save(self.output_file)
+
+class BulkAllocationCollector:
+    # Streams each file's BulkAllocation rows into the MasterBulkAllocation output as
+    # soon as the file finishes, so memory stays flat across a batch. xlsx and parquet
+    # are only readable once closed, so their rows are mirrored to a CSV spool next to
+    # the master file, which is left behind as a usable partial result if the run
+    # aborts and removed once the output is complete. CSV output is its own spool.
+    def __init__(self, base_path, io_settings):
+        self.base_path = base_path
+        self.io_settings = io_settings
+        self.output_format = io_settings["output_format"]
+        self.output_file = get_output_path(base_path, self.output_format, 'MasterBulkAllocation')
+        self.spool_file = f'{base_path}.partial.csv'
+        if self.output_format == "csv":
+            self.spool_file = self.output_file
+        self.header_written = False
+        self.parquet_writer = None
+        if self.output_format == "xlsx":
+            self.workbook = StreamingWorkbook(self.output_file, io_settings["write_engine"])
+            self.worksheet = self.workbook.add_sheet('MasterBulkAllocation')
+        if os.path.exists(self.spool_file):
+            os.remove(self.spool_file)
+
+    def append(self, bulk_allocation_df):
+        if self.output_format == "xlsx":
+            self.workbook.append_frame('MasterBulkAllocation', self.worksheet, bulk_allocation_df, header=not self.header_written)
+        elif self.output_format == "parquet":
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            # Each file becomes one row group. The schema is declared rather than
+            # inferred from the first file, whose columns are null when it selected
+            # nothing and would then reject every later file
+            if self.parquet_writer is None:
+                schema = pa.schema([(column, pa.string()) for column in bulk_allocation_df.columns])
+                self.parquet_writer = pq.ParquetWriter(self.output_file, schema)
+            table = pa.Table.from_pandas(bulk_allocation_df.astype("string"), schema=self.parquet_writer.schema, preserve_index=False)
+            self.parquet_writer.write_table(table)
+        bulk_allocation_df.to_csv(self.spool_file, mode='a', header=not self.header_written, index=False)
+        self.header_written = True
+
+    def close(self, sheets):
+        if self.output_format == "xlsx":
+            for sheet_name, sheet_df in sheets.items():
+                self.workbook.append_frame(sheet_name, self.workbook.add_sheet(sheet_name), sheet_df)
+            self.workbook.save()
+        else:
+            if self.parquet_writer is not None:
+                self.parquet_writer.close()
+            elif not self.header_written:
+                # Nothing was processed; still leave an (empty) master output behind
+                write_sheets(self.base_path, {'MasterBulkAllocation': pd.DataFrame()}, self.io_settings)
+            write_sheets(self.base_path, sheets, self.io_settings)
+        if self.spool_file != self.output_file and os.path.exists(self.spool_file):
+            os.remove(self.spool_file)
+
+def get_worker_count(config, file_count=None):
+    # A max_workers of 0 means one worker per CPU core; file_count, when known,
+    # caps it so no worker is started with nothing to do
+    requested = config.get("max_workers") or os.cpu_count() or 1
+    return max(1, min(requested, file_count or requested))
+
+def get_peak_rss_mb():
+    # Peak resident memory of this process so far, or None where it cannot be read
+    if resource is not None:
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Kilobytes on Linux, bytes on macOS
+        return round(peak_rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+    if importlib.util.find_spec("psutil") is not None:
+        import psutil
+        memory_info = psutil.Process().memory_info()
+        return round(getattr(memory_info, "peak_wset", memory_info.rss) / (1024 * 1024), 1)
+    return None
+
+class StageTimer:
+    # Records wall time, rows and memory for each stage of one file. Records are
+    # plain dicts so they travel back from worker processes with the result.
+    def __init__(self, trace_memory=False, stages=None):
+        self.trace_memory = trace_memory
+        self.stages = stages if stages is not None else []
+
+    @contextmanager
+    def stage(self, name):
+        record = {"stage": name, "rows": None}
+        if self.trace_memory:
+            # tracemalloc slows allocation-heavy code noticeably, hence opt-in
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            traced_at_start = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record["seconds"] = round(time.perf_counter() - start, 4)
+            if self.trace_memory:
+                # Measured above what was already allocated when the stage began
+                record["peak_traced_mb"] = round((tracemalloc.get_traced_memory()[1] - traced_at_start) / (1024 * 1024), 1)
+            record["peak_rss_mb"] = get_peak_rss_mb()
+            self.stages.append(record)
+
+def build_file_report(file_path, status, stages):
+    return {
+        "file": os.path.basename(file_path),
+        "path": os.path.abspath(file_path),
+        "status": status,
+        "seconds": round(sum(record["seconds"] for record in stages), 4),
+        "stages": stages
+    }
+
+def build_run_report(started_at, allocation_settings, io_settings, counters, files):
+    finished_at = datetime.now()
+    return {
+        "started_at": started_at.isoformat(timespec="seconds"),
+        "finished_at": finished_at.isoformat(timespec="seconds"),
+        "seconds": round((finished_at - started_at).total_seconds(), 3),
+        "allocation_settings": allocation_settings,
+        "io_settings": io_settings,
+        "counters": counters,
+        "files": files
+    }
+
+def write_run_report(dir_path, report):
+    # One report per run, named after its start time, so runs can be compared later
+    started_at = datetime.fromisoformat(report["started_at"])
+    report_file = os.path.join(dir_path, f"run_report_{started_at:%Y%m%d_%H%M%S}.json")
+    try:
+        with open(report_file, "w") as f:
+            json.dump(report, f, indent=4, default=str)
+    except Exception as e:
+        print(f"Failed to write run report: {e}")
+        return None
+    return report_file
+
+def build_moderator_mapping(evaluator_pool, seed=None):
+    # Each evaluator in a shuffled circle is moderated by the next one along. That
+    # is a random single-cycle derangement: in O(E), nobody moderates their own
+    # scripts and every evaluator is both covered and used exactly once
+    evaluator_pool = [evaluator for evaluator in evaluator_pool if not pd.isna(evaluator)]
+    if len(evaluator_pool) < 2:
+        return {}
+
+    # A seed (moderator_seed in the config) makes the mapping reproducible
+    order = np.random.default_rng(seed).permutation(len(evaluator_pool))
+    circle = [evaluator_pool[index] for index in order]
+    return dict(zip(circle, circle[1:] + circle[:1]))
+
+def finish_allocation(file_path, sorted_data, io_settings, stages=None):
+    timer = StageTimer(io_settings["trace_memory"], stages)
+    with timer.stage("pivot") as record:
+        bulk_allocation_df, allocation_summary_df = build_allocation_outputs(sorted_data)
+        record["rows"] = len(bulk_allocation_df)
+
+    output_file = None
+    if io_settings["individual_files"]:
+        dir_path = os.path.dirname(file_path)
+        filename = f'bulk_allocation_{os.path.splitext(os.path.basename(file_path))[0]}'
+        base_path = os.path.join(dir_path, f'{filename}')
+        with timer.stage("write") as record:
+            write_allocation_file(base_path, bulk_allocation_df, sorted_data, allocation_summary_df, io_settings)
+            record["rows"] = len(sorted_data)
+        output_file = get_output_path(base_path, io_settings["output_format"], 'BulkAllocation')
+
+    return {"status": "processed", "bulk_allocation_df": bulk_allocation_df, "output_file": output_file, "stages": timer.stages}
+
+def load_categorized_file(file_path, allocation_settings, io_settings, timer):
+    # Sorting and categorising depend only on the input and the booklet split, so a
+    # run that changes just the pick percentages or the seed reuses the last result
+    booklet_split = get_booklet_split(allocation_settings)
+    max_bytes = io_settings["cache_max_bytes"]
+    key = None
+    if max_bytes:
+        try:
+            key = get_cache_key(file_path, "categorized", io_settings["read_engine"], io_settings["input_columns"], *booklet_split)
+        except OSError:
+            # The read below reports a missing or unreadable file as invalid
+            pass
+    if key is not None:
+        with timer.stage("cache lookup") as record:
+            sorted_data = read_cached_frame(key)
+            record["rows"] = 0 if sorted_data is None else len(sorted_data)
+        if sorted_data is not None:
+            print("Reusing categories from the previous run")
+            return {"status": "categorized", "sorted_data": sorted_data}
+
+    with timer.stage("read") as record:
+        data, missing_columns = load_input_file_cached(file_path, io_settings)
+        record["rows"] = 0 if data is None else len(data)
+    if data is None:
+        return {"status": "invalid", "missing_columns": missing_columns[file_path]}
+
+    with timer.stage("categorize") as record:
+        invalid_cycle_values, sorted_data = categorize_allocation(data, *booklet_split)
+        record["rows"] = len(data)
+    if invalid_cycle_values:
+        return {"status": "unusual_cycle", "invalid_cycles": invalid_cycle_values}
+
+    if key is not None:
+        write_cached_frame(key, sorted_data, max_bytes)
+    return {"status": "categorized", "sorted_data": sorted_data}
+
+def allocate_categorized(file_path, sorted_data, allocation_settings, io_settings, timer):
+    with timer.stage("sample") as record:
+        sorted_data = sample_allocation(sorted_data, **get_sampling_settings(allocation_settings))
+        record["rows"] = len(sorted_data)
+
+    sorted_data['Moderator'] = None
+    # Primary rows without an evaluator are never selected, and a blank in the
+    # pool would be handed a real evaluator's scripts to moderate
+    evaluator_pool = sorted_data['Evaluated By'].dropna().unique().tolist()
+    if len(evaluator_pool) == 1:
+        return {"status": "single_evaluator", "sole_evaluator": evaluator_pool[0], "sorted_data": sorted_data, "stages": timer.stages}
+
+    with timer.stage("assign moderators") as record:
+        moderator_mapping = build_moderator_mapping(evaluator_pool, allocation_settings["moderator_seed"])
+        sorted_data['Moderator'] = sorted_data['Evaluated By'].map(moderator_mapping)
+        record["rows"] = len(sorted_data)
+    return finish_allocation(file_path, sorted_data, io_settings, timer.stages)
+
+def allocate_file(file_path, allocation_settings, io_settings):
+    # Runs in a worker process, so it must not touch the UI. Files with a single
+    # evaluator are handed back unfinished for the interactive prompt.
+    print(f"Started processing: {os.path.splitext(os.path.basename(file_path))[0]}")
+    timer = StageTimer(io_settings["trace_memory"])
+
+    categorized = load_categorized_file(file_path, allocation_settings, io_settings, timer)
+    if categorized["status"] != "categorized":
+        return {**categorized, "stages": timer.stages}
+    return allocate_categorized(file_path, categorized["sorted_data"], allocation_settings, io_settings, timer)
+
+def get_schedule_path(file_path, schedule_id):
+    # A schedule from a consolidated export is reported and written as if it had
+    # been exported on its own, e.g. results.xlsx -> bulk_allocation_results_1001.xlsx
+    root, ext = os.path.splitext(file_path)
+    if isinstance(schedule_id, float) and schedule_id.is_integer():
+        # Excel hands back 1001.0 when the column also has blanks
+        schedule_id = int(schedule_id)
+    schedule_name = re.sub(r'[\\/:*?"<>|]', '_', str(schedule_id))
+    return f"{root}_{schedule_name}{ext}"
+
+def allocate_schedule(schedule_path, data, stages, allocation_settings, io_settings):
+    # Worker side of split_by_schedule: data is one schedule's rows, already parsed
+    # by the caller, so only the categorise, sample and assign stages run here
+    print(f"Started processing: {os.path.splitext(os.path.basename(schedule_path))[0]}")
+    timer = StageTimer(io_settings["trace_memory"], list(stages))
+
+    with timer.stage("categorize") as record:
+        invalid_cycle_values, sorted_data = categorize_allocation(data, *get_booklet_split(allocation_settings))
+        record["rows"] = len(data)
+    if invalid_cycle_values:
+        return {"status": "unusual_cycle", "invalid_cycles": invalid_cycle_values, "stages": timer.stages}
+    return allocate_categorized(schedule_path, sorted_data, allocation_settings, io_settings, timer)
+
+def invalid_file(missing_columns, allocation_settings, io_settings):
+    return {"status": "invalid", "missing_columns": missing_columns, "stages": []}
+
+def iter_allocation_jobs(file_path, io_settings):
+    # What a selected file is allocated as: (path, function, arguments) jobs, each
+    # called as function(*arguments, allocation_settings, io_settings). Normally
+    # that is the file itself. With split_by_schedule a consolidated export is
+    # parsed once, here, and grouped by Schedule Id once; each schedule's rows are
+    # only copied out as its job is yielded, so they can be handed off and dropped.
+    if not io_settings["split_by_schedule"]:
+        yield file_path, allocate_file, (file_path,)
+        return
+
+    timer = StageTimer(io_settings["trace_memory"])
+    with timer.stage("read") as record:
+        data, missing_columns = load_input_file_cached(file_path, io_settings)
+        record["rows"] = 0 if data is None else len(data)
+    if data is None:
+        yield file_path, invalid_file, (missing_columns[file_path],)
+        return
+
+    with timer.stage("partition") as record:
+        schedule_rows = data.groupby('Schedule Id', sort=False, dropna=False).indices
+        record["rows"] = len(data)
+
+    # The file's read and partition stages are reported with its first schedule
+    stages = timer.stages
+    for schedule_id, positions in schedule_rows.items():
+        schedule_path = get_schedule_path(file_path, schedule_id)
+        yield schedule_path, allocate_schedule, (schedule_path, data.take(positions), stages)
+        stages = []
+
+def run_allocation_job(job, allocation_settings, io_settings):
+    _, function, arguments = job
+    return function(*arguments, allocation_settings, io_settings)
+
+def iter_allocation_results(file_paths, allocation_settings, io_settings, executor=None, window=1):
+    # Yields (path, result) in job order. Jobs are submitted as soon as their file
+    # is read (or partitioned), so reading the next file overlaps allocating the
+    # last one, and at most `window` results wait ahead of the consumer, which
+    # keeps the partitions in flight, and so memory, bounded across a batch
+    pending = deque()
+    for file_path in file_paths:
+        for job in iter_allocation_jobs(file_path, io_settings):
+            if executor is None:
+                yield job[0], run_allocation_job(job, allocation_settings, io_settings)
+                continue
+            pending.append((job[0], executor.submit(run_allocation_job, job, allocation_settings, io_settings)))
+            if len(pending) > window:
+                unit_path, future = pending.popleft()
+                yield unit_path, future.result()
+    while pending:
+        unit_path, future = pending.popleft()
+        yield unit_path, future.result()
+
+def get_allocation_settings(config):
+    return {
+        "top_selected_booklets": int(config["top_booklet"]),
+        "middle_selected_booklets": int(config["middle_booklet"]),
+        "bottom_selected_booklets": int(config["bottom_booklet"]),
+        "top_picked_booklets": int(config["top_pick"]),
+        "middle_picked_booklets": int(config["middle_pick"]),
+        "bottom_picked_booklets": int(config["bottom_pick"]),
+        "sampling_seed": config["sampling_seed"],
+        "moderator_seed": config["moderator_seed"]
+    }
+
+def build_status_sheets(successfully_processed, unusual_cycle_skipped, user_skipped, invalid_files):
+    return {
+        'SuccessfullyProcessed': pd.DataFrame(successfully_processed, columns=["Successfully Processed Files"]),
+        'UnusualCycleSkipped': pd.DataFrame(unusual_cycle_skipped, columns=["Processing skipped because of unusual cycles"]),
+        'SkippedByUser': pd.DataFrame(user_skipped, columns=["Processing skipped because of user input"]),
+        'InvalidFile': pd.DataFrame(invalid_files, columns=["Processing skipped because of invalid file format"])
+    }
+
+def run_batch(file_paths, config, individual_files=True, bulk_file=True, single_evaluator="skip"):
+    # Headless counterpart of the GUI's Run button. There is nobody to ask when a
+    # file has a single evaluator, so single_evaluator decides: "skip" the file or
+    # let the "same" evaluator moderate their own scripts.
+    started_at = datetime.now()
+    allocation_settings = get_allocation_settings(config)
+    io_settings = get_io_settings(config, individual_files)
+    summary = {"processed": [], "unusual_cycle": [], "user_skipped": [], "invalid": [], "master_output_file": None, "report_file": None}
+    file_reports = []
+
+    master_bulk_allocation = None
+    if bulk_file:
+        master_bulk_allocation = BulkAllocationCollector(
+            os.path.join(os.path.dirname(file_paths[0]), 'master_bulk_allocation_file'), io_settings
+        )
+
+    # A consolidated export can hold any number of schedules, so only the file
+    # count caps the pool when every file is one job
+    worker_count = get_worker_count(config, None if io_settings["split_by_schedule"] else len(file_paths))
+    executor = None
+    if worker_count > 1:
+        executor = ProcessPoolExecutor(max_workers=worker_count, mp_context=multiprocessing.get_context("spawn"))
+    job_count = 0
+    try:
+        # Results come back in input order, keeping the master file deterministic
+        for file_path, result in iter_allocation_results(file_paths, allocation_settings, io_settings, executor, 2 * worker_count):
+            job_count += 1
+            file_name = os.path.splitext(os.path.basename(file_path))[0]
+            if result["status"] == "invalid":
+                print(f"{file_name}: invalid file format, missing columns: {', '.join(result['missing_columns'])}")
+                summary["invalid"].append(file_name)
+                file_reports.append(build_file_report(file_path, "invalid", result["stages"]))
+                continue
+            if result["status"] == "unusual_cycle":
+                print(f"{file_name}: skipped, found invalid cycles: {', '.join(result['invalid_cycles'])}")
+                summary["unusual_cycle"].append(file_name)
+                file_reports.append(build_file_report(file_path, "unusual_cycle", result["stages"]))
+                continue
+            if result["status"] == "single_evaluator":
+                if single_evaluator != "same":
+                    print(f"{file_name}: skipped, single evaluator found: {result['sole_evaluator']}")
+                    summary["user_skipped"].append(file_name)
+                    file_reports.append(build_file_report(file_path, "user_skipped", result["stages"]))
+                    continue
+                sorted_data = result["sorted_data"]
+                sorted_data['Moderator'] = sorted_data['Evaluated By']
+                result = finish_allocation(file_path, sorted_data, io_settings, result["stages"])
+
+            print(f"{file_name}: processed")
+            summary["processed"].append(os.path.basename(file_path))
+            file_reports.append(build_file_report(file_path, "processed", result["stages"]))
+            if master_bulk_allocation is not None:
+                master_bulk_allocation.append(result["bulk_allocation_df"])
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+    if master_bulk_allocation is not None:
+        master_bulk_allocation.close(build_status_sheets(
+            summary["processed"], summary["unusual_cycle"], summary["user_skipped"], summary["invalid"]
+        ))
+        summary["master_output_file"] = master_bulk_allocation.output_file
+
+    counters = {
+        "valid_format_files": job_count - len(summary["invalid"]),
+        "invalid_format_files": len(summary["invalid"]),
+        "successfully_processed_files": len(summary["processed"]),
+        "unusual_evaluation_cycle_files": len(summary["unusual_cycle"]),
+        "user_skipped_files": len(summary["user_skipped"])
+    }
+    summary["report_file"] = write_run_report(
+        os.path.dirname(file_paths[0]),
+        build_run_report(started_at, allocation_settings, io_settings, counters, file_reports)
+    )
+    return summary
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Allocate booklets for moderation without starting the GUI.")
+    parser.add_argument("--headless", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--files", nargs="+", required=True, help="input exports (.xlsx, .csv or .parquet)")
+    parser.add_argument("--config", help="user_config.json with percentages and output options "
+                                         "(default: the GUI's saved settings, or the defaults)")
+    parser.add_argument("--single-evaluator", choices=["skip", "same"], default="skip",
+                        help="what to do with files that have only one evaluator (default: skip)")
+    args = parser.parse_args(argv)
+
+    # Only the GUI's own config may be absent; a path given explicitly that does
+    # not exist is a mistake, not a request for the defaults
+    if args.config is not None and not os.path.isfile(args.config):
+        parser.error(f"config file not found: {args.config}")
+    config = load_config(args.config or CONFIG_FILE)
+    if config["top_booklet"] + config["middle_booklet"] + config["bottom_booklet"] != 100:
+        parser.error("booklet categorization total must be exactly 100%")
+    if config["top_pick"] + config["middle_pick"] + config["bottom_pick"] > 100:
+        parser.error("total pick must be <= 100%")
+
+    summary = run_batch(
+        args.files,
+        config,
+        individual_files=config["individual_toggle"],
+        bulk_file=config["bulk_toggle"],
+        single_evaluator=args.single_evaluator
+    )
+
+    print(f"Successfully processed: {len(summary['processed'])}")
+    print(f"Skipped due to unusual cycle: {len(summary['unusual_cycle'])}")
+    print(f"Skipped because of single evaluator: {len(summary['user_skipped'])}")
+    print(f"Invalid files: {len(summary['invalid'])}")
+    if summary["master_output_file"]:
+        print(f"Master Bulk File: {summary['master_output_file']}")
+    if summary["report_file"]:
+        print(f"Run Report: {summary['report_file']}")
+    return 0
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
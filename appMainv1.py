@@ -1,45 +1,55 @@
 import os
+import sys
+import time
+import multiprocessing
+
+STARTUP_BEGIN = time.perf_counter()
+PROFILE_STARTUP = "--profile-startup" in sys.argv[1:]
+
+if __name__ == "__main__":
+    # Frozen worker processes must branch off before anything heavy is imported
+    multiprocessing.freeze_support()
+    if "--headless" in sys.argv[1:]:
+        # Run the engine as the main module, so neither this process nor its
+        # worker processes ever import Flet
+        import runpy
+        runpy.run_module("allocation_engine", run_name="__main__", alter_sys=True)
+        sys.exit()
+
 import flet as ft
 import asyncio
-import pandas as pd
-import math
-import random
-import json
-import sys
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from moderator_config import load_config, save_config
+
+def report_startup(stage: str, since: float = STARTUP_BEGIN):
+    # Enabled with --profile-startup; times are measured from the first line of this module
+    if PROFILE_STARTUP:
+        print(f"[startup] {stage}: {(time.perf_counter() - since) * 1000:.0f} ms")
+
+def load_engine():
+    # pandas and the Excel engines are only imported on first use (or by the
+    # background warm-up), so the window can paint before they load
+    import allocation_engine
+    return allocation_engine
+
+def warm_up_engine():
+    warm_up_begin = time.perf_counter()
+    load_engine()
+    report_startup("allocation engine imported in background", warm_up_begin)
+
+report_startup("flet imported")
+
+# Log lines are buffered and pushed to the client at most this often, or as soon
+# as this many are waiting; only the newest MAX_LOG_LINES controls are kept
+LOG_FLUSH_INTERVAL = 0.2
+LOG_FLUSH_LINES = 200
+MAX_LOG_LINES = 1000
 
-APP_NAME = "Moderator Tool"
-CONFIG_FILENAME = "user_config.json"
-
-def get_config_path():
-    if sys.platform == "win32":
-        appdata = os.environ.get("LOCALAPPDATA", os.path.expanduser("~\\AppData\\Local"))
-        folder = os.path.join(appdata, APP_NAME)
-    elif sys.platform == "darwin":
-        folder = os.path.join(os.path.expanduser("~/Library/Application Support/"), APP_NAME)
-    else:
-        folder = os.path.join(os.path.expanduser("~/.config/"), APP_NAME)
-    os.makedirs(folder, exist_ok=True)
-    return os.path.join(folder, CONFIG_FILENAME)
-
-CONFIG_FILE = get_config_path()
-
-# CONFIG_FILE = "user_config.json"
-
-default_config = {
-    "top_booklet": 20,
-    "middle_booklet": 40,
-    "bottom_booklet": 40,
-    "top_pick": 5,
-    "middle_pick": 10,
-    "bottom_pick": 5,
-    "individual_toggle": True,
-    "bulk_toggle": True
-}
-
-REQUIRED_COLUMNS = ["Register Number", "Name of the student", "Schedule Id", "Schedule Name", "Email of the student", "Total Marks", "Exam Appearance Status", "Evaluated By", "Evaluator Id", "Script Id", "Cycle"]
 alternate_eval_choice = None
 sole_evaluator = None
-master_bulk_allocation_df = None
+master_bulk_allocation = None
 skip_processing_current_file = False
 
 count_valid_format_files = 0
@@ -55,42 +65,6 @@ list_successfully_processed_files = set()
 list_unusual_evaluation_cycle_files = set()
 list_user_skipped_files = set()
 
-def load_config():
-    if os.path.exists(CONFIG_FILE):
-        try:
-            with open(CONFIG_FILE, "r") as f:
-                config = json.load(f)
-                # Merge loaded config with default_config to ensure keys
-                return {**default_config, **config}
-        except Exception as e:
-            print(f"Failed to load config: {e}")
-    return default_config.copy()
-
-def save_config(config):
-    try:
-        with open(CONFIG_FILE, "w") as f:
-            json.dump(config, f, indent=4)
-        print("Config saved.")
-    except Exception as e:
-        print(f"Failed to save config: {e}")
-
-def validate_input_file(file1_path):
-    def get_missing_columns(file_path):
-        try:
-            df = pd.read_excel(file_path, sheet_name=0)
-            return [col for col in REQUIRED_COLUMNS if col not in df.columns]
-        except Exception as e:
-            return REQUIRED_COLUMNS
-
-    missing_values = get_missing_columns(file1_path)
-
-    valid_file = not missing_values
-    missing_columns = {
-        file1_path: missing_values if not valid_file else []
-    }
-
-    return valid_file, missing_columns
-
 def section_header(title: str, subtitle: str) -> ft.Container:
     return ft.Container(
         content=ft.Column([
@@ -100,7 +74,7 @@ def section_header(title: str, subtitle: str) -> ft.Container:
         col={"xs": 12, "md": 3}
     )
 
-def percentage_input(label: str, value: int, suffix_text: str, on_update_callback=None) -> ft.TextField:
+def percentage_input(label: str, value: int, suffix_text: str, on_update_callback=None, on_change_callback=None) -> ft.TextField:
     def on_blur(e: ft.ControlEvent):
         cleaned = ''.join(filter(str.isdigit, e.control.value))
         if e.control.value != cleaned:
@@ -110,6 +84,10 @@ def percentage_input(label: str, value: int, suffix_text: str, on_update_callbac
         if on_update_callback:
             on_update_callback()
 
+    def on_change(e: ft.ControlEvent):
+        if on_change_callback:
+            on_change_callback()
+
     return ft.TextField(
         label=label,
         dense=True,
@@ -117,9 +95,16 @@ def percentage_input(label: str, value: int, suffix_text: str, on_update_callbac
         suffix=ft.Text(suffix_text, size=11, italic=True),
         keyboard_type=ft.KeyboardType.NUMBER,
         border_color="grey",
-        on_blur=on_blur
+        on_blur=on_blur,
+        on_change=on_change
     )
 
+def read_percentages(fields: list[ft.TextField]) -> list[int] | None:
+    # None while any field is empty or half-typed
+    if all(field.value.isdigit() for field in fields):
+        return [int(field.value) for field in fields]
+    return None
+
 def labeled_toggle(text: str, toggle: ft.Switch, align="start", col_span=4) -> ft.Container:
     return ft.Container(
         content=ft.Row(
@@ -148,6 +133,7 @@ def responsive_input_row(title: str, subtitle: str, inputs: list[ft.TextField])
 # ---------- Main App ----------
 
 async def main(page: ft.Page):
+    report_startup("main() entered")
     page.title = "Moderator Allocation Tool"
     page.scroll = True
     page.padding = 20
@@ -171,7 +157,7 @@ async def main(page: ft.Page):
         global list_user_skipped_files
 
         global alternate_eval_choice
-        global master_bulk_allocation_df
+        global master_bulk_allocation
 
         # Reset counters
         count_valid_format_files = 0
@@ -187,13 +173,6 @@ async def main(page: ft.Page):
         list_unusual_evaluation_cycle_files.clear()
         list_user_skipped_files.clear()
 
-        # global sole_evaluator
-        if bulk_toggle.value:
-            master_bulk_allocation_df = pd.DataFrame()
-        else:
-            master_bulk_allocation_df = None
-
-
         selected_files = page.session.get("selected_files") or []
         has_valid_files = len(selected_files) > 0
         category_valid = validate_category_total()
@@ -226,62 +205,119 @@ async def main(page: ft.Page):
             run_button.update()
             return
 
+        started_at = datetime.now()
+        allocation_engine = await asyncio.to_thread(load_engine)
+        io_settings = allocation_engine.get_io_settings(user_config, individual_toggle.value)
+        file_reports = []
+
+        # global sole_evaluator
+        if bulk_toggle.value:
+            dir_path = os.path.dirname(selected_files[0])
+            filename = f'master_bulk_allocation_file'
+            master_bulk_allocation = allocation_engine.BulkAllocationCollector(os.path.join(dir_path, f'{filename}'), io_settings)
+            output_file = master_bulk_allocation.output_file
+        else:
+            master_bulk_allocation = None
+
         progress_container.visible = True
         progress_bar.value = 0
         page.update()
+        start_log_flusher()
 
+        # With split_by_schedule each Schedule Id in a file is allocated and listed as
+        # its own file, and how many there are is only known once every file is read
+        split_by_schedule = io_settings["split_by_schedule"]
         total = len(selected_files)
 
-        for index, file_path in enumerate(selected_files, start=1):
-            processing_label.visible = True
-            processing_label.value = f"Processing file ({index}/{total}): {file_path.split('/')[-1]}"
-            progress_bar.value = index / total
-            page.update()
+        allocation_settings = {
+            "top_selected_booklets": int(top_booklet_input.value),
+            "middle_selected_booklets": int(middle_booklet_input.value),
+            "bottom_selected_booklets": int(bottom_booklet_input.value),
+            "top_picked_booklets": int(top_pick_input.value),
+            "middle_picked_booklets": int(middle_pick_input.value),
+            "bottom_picked_booklets": int(bottom_pick_input.value),
+            "sampling_seed": user_config["sampling_seed"],
+            "moderator_seed": user_config["moderator_seed"]
+        }
+        print(f"Selected Booklets => Top: {allocation_settings['top_selected_booklets']}%, Middle: {allocation_settings['middle_selected_booklets']}%, Bottom: {allocation_settings['bottom_selected_booklets']}%")
+        print(f"Picked Booklets => Top: {allocation_settings['top_picked_booklets']}%, Middle: {allocation_settings['middle_picked_booklets']}%, Bottom: {allocation_settings['bottom_picked_booklets']}%")
+        print(f"Output Options => Individual Files: {individual_toggle.value}, Bulk File: {bulk_toggle.value}")
+
+        # Files are allocated concurrently but consumed in selection order, so the
+        # log, the single-evaluator prompts and the master file stay deterministic
+        worker_count = allocation_engine.get_worker_count(user_config, None if split_by_schedule else total)
+        executor = None
+        if worker_count > 1:
+            executor = ProcessPoolExecutor(max_workers=worker_count, mp_context=multiprocessing.get_context("spawn"))
+        # Without an executor each job runs in turn inside the thread that fetches
+        # it, so max_workers: 1 reads one file at a time, as run_batch does
+        results = allocation_engine.iter_allocation_results(
+            selected_files, allocation_settings, io_settings, executor, 2 * worker_count
+        )
 
-            file_validity, missing_columns = validate_input_file(file_path)
-            if file_validity:
-                count_valid_format_files += 1
-                list_valid_format_files.add(file_path.split('/')[-1])
-                add_log_line(f"🟢 Started Processing {os.path.splitext(os.path.basename(file_path))[0]}")
-                add_log_line(f"{" " * 8}✅ File format is valid.")
-                result = await process_test(
-                    file_path=file_path,
-                    top_selected_booklets=int(top_booklet_input.value),
-                    middle_selected_booklets=int(middle_booklet_input.value),
-                    bottom_selected_booklets=int(bottom_booklet_input.value),
-                    top_picked_booklets=int(top_pick_input.value),
-                    middle_picked_booklets=int(middle_pick_input.value),
-                    bottom_picked_booklets=int(bottom_pick_input.value),
-                    individual_files=individual_toggle.value,
-                    bulk_file=bulk_toggle.value
-                )
-            else:
-                list_invalid_format_files.add(os.path.splitext(os.path.basename(file_path))[0])
-                count_invalid_format_files += 1
-                add_log_line(f"🔴 Skipped Processing {os.path.splitext(os.path.basename(file_path))[0]}")
-                add_log_line(f"{" " * 8}⛔ The file format is invalid.")
-                add_log_line(f"{" " * 8}⛔ Missing columns are: {', '.join(missing_columns[file_path])}")
-                await asyncio.sleep(1)
-                continue
-
-        success_df = pd.DataFrame(list_successfully_processed_files, columns=["Successfully Processed Files"])
-        skippped_unusual_cycle_df = pd.DataFrame(list_unusual_evaluation_cycle_files, columns=["Processing skipped because of unusual cycles"])
-        skippped_by_user_df = pd.DataFrame(list_user_skipped_files, columns=["Processing skipped because of user input"])
-        invalid_files_df = pd.DataFrame(list_invalid_format_files, columns=["Processing skipped because of invalid file format"])
-
-        if bulk_toggle:
-            dir_path = os.path.dirname(selected_files[0])
-            filename = f'master_bulk_allocation_file.xlsx'
-            output_file = os.path.join(dir_path, f'{filename}')
-            with pd.ExcelWriter(output_file, engine='openpyxl') as writer:
-                master_bulk_allocation_df.to_excel(writer, sheet_name='MasterBulkAllocation', index=False)
-                success_df.to_excel(writer, sheet_name='SuccessfullyProcessed', index=False)
-                skippped_unusual_cycle_df.to_excel(writer, sheet_name='UnusualCycleSkipped', index=False)
-                skippped_by_user_df.to_excel(writer, sheet_name='SkippedByUser', index=False)
-                invalid_files_df.to_excel(writer, sheet_name='InvalidFile', index=False)
+        try:
+            index = 0
+            while (next_result := await asyncio.to_thread(next, results, None)) is not None:
+                file_path, result = next_result
+                index += 1
+                processing_label.visible = True
+                if split_by_schedule:
+                    processing_label.value = f"Processing schedule ({index}): {file_path.split('/')[-1]}"
+                else:
+                    processing_label.value = f"Processing file ({index}/{total}): {file_path.split('/')[-1]}"
+                    progress_bar.value = index / total
+                page.update()
+
+                if result["status"] != "invalid":
+                    count_valid_format_files += 1
+                    list_valid_format_files.add(file_path.split('/')[-1])
+                    add_log_line(f"🟢 Started Processing {os.path.splitext(os.path.basename(file_path))[0]}")
+                    add_log_line(f"{" " * 8}✅ File format is valid.")
+                    result = await process_test(
+                        file_path=file_path,
+                        result=result,
+                        io_settings=io_settings,
+                        bulk_file=bulk_toggle.value
+                    )
+                    status = "user_skipped" if skip_processing_current_file else result["status"]
+                    file_reports.append(allocation_engine.build_file_report(file_path, status, result["stages"]))
+                else:
+                    file_reports.append(allocation_engine.build_file_report(file_path, "invalid", result["stages"]))
+                    list_invalid_format_files.add(os.path.splitext(os.path.basename(file_path))[0])
+                    count_invalid_format_files += 1
+                    add_log_line(f"🔴 Skipped Processing {os.path.splitext(os.path.basename(file_path))[0]}")
+                    add_log_line(f"{" " * 8}⛔ The file format is invalid.")
+                    add_log_line(f"{" " * 8}⛔ Missing columns are: {', '.join(result['missing_columns'])}")
+                    continue
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+
+        if bulk_toggle.value:
+            await asyncio.to_thread(master_bulk_allocation.close, allocation_engine.build_status_sheets(
+                list_successfully_processed_files,
+                list_unusual_evaluation_cycle_files,
+                list_user_skipped_files,
+                list_invalid_format_files
+            ))
             add_log_line(" ")
             add_log_line(f"✅ Bulk Master file successfully processed and saved at {output_file}")
 
+        # Stage timings for every file plus the run counters, for comparing runs later
+        report_file = await asyncio.to_thread(
+            allocation_engine.write_run_report,
+            os.path.dirname(selected_files[0]),
+            allocation_engine.build_run_report(started_at, allocation_settings, io_settings, {
+                "valid_format_files": count_valid_format_files,
+                "invalid_format_files": count_invalid_format_files,
+                "successfully_processed_files": count_successfully_processed_files,
+                "unusual_evaluation_cycle_files": count_unusual_evaluation_cycle_files,
+                "user_skipped_files": count_user_skipped_files
+            }, file_reports)
+        )
+        if report_file:
+            add_log_line(f"📄 Run report saved at {report_file}")
+
         progress_container.visible = True
         processing_label.visible = True
         processing_label.value = "🎉🎉🎉 Congratulations!!! All files processed successfully!"
@@ -324,7 +360,8 @@ async def main(page: ft.Page):
             add_log_line(" ")
             add_log_line(f"Master Bulk Files: {output_file}")
 
-        await asyncio.sleep(1)
+        # Push the summary to the client before announcing completion
+        stop_log_flusher()
         page.open(ft.SnackBar(
             content=ft.Text(f"✅ Successfully processed {total} file(s)."),
             bgcolor="#2DB567",
@@ -399,6 +436,76 @@ async def main(page: ft.Page):
             )
         return is_valid
 
+    # ---------- Selection Preview ----------
+    # Per-evaluator script counts for the selected files, filled in the background
+    # once files are picked; every percentage edit recomputes from these alone
+    preview_state = {"counts": {}}
+
+    preview_summary = ft.Text("", size=12, italic=True, color="grey600")
+    preview_table = ft.DataTable(
+        columns=[
+            ft.DataColumn(ft.Text(name, size=12, weight=ft.FontWeight.W_500), numeric=name != "Evaluator")
+            for name in ["Evaluator", "Scripts", "Top", "Middle", "Bottom", "Selected"]
+        ],
+        rows=[],
+        heading_row_height=32,
+        data_row_min_height=28,
+        data_row_max_height=28,
+        column_spacing=24
+    )
+    preview_container = ft.ResponsiveRow(
+        controls=[
+            section_header("Selection Preview", "Scripts each evaluator sends to moderation"),
+            ft.Container(
+                content=ft.Column([
+                    preview_summary,
+                    ft.Column([preview_table], scroll=ft.ScrollMode.AUTO, height=240)
+                ], spacing=6),
+                col={"xs": 12, "md": 9}
+            )
+        ],
+        spacing=10,
+        run_spacing=10,
+        visible=False
+    )
+
+    def refresh_preview():
+        counts = [file_counts for file_counts in preview_state["counts"].values() if file_counts is not None]
+        preview_container.visible = bool(counts)
+        if counts:
+            booklet_split = read_percentages(categorization_inputs)
+            pick_percents = read_percentages(pick_inputs)
+            if booklet_split is None or pick_percents is None or sum(booklet_split) != 100 or sum(pick_percents) > 100:
+                preview_summary.value = "Fix the percentages above to see the preview."
+                preview_table.rows = []
+            else:
+                preview = load_engine().preview_selection_counts(counts, booklet_split, pick_percents)
+                preview_summary.value = (
+                    f"{preview['Selected'].sum()} of {preview['Scripts'].sum()} scripts from "
+                    f"{len(preview)} evaluator(s) will be selected for moderation"
+                )
+                preview_table.rows = [
+                    ft.DataRow(cells=[ft.DataCell(ft.Text(str(value), size=12)) for value in (evaluator, *row)])
+                    for evaluator, row in zip(preview.index, preview.itertuples(index=False))
+                ]
+        if preview_container.page:
+            preview_container.update()
+
+    async def load_preview_counts(file_paths: list[str]):
+        allocation_engine = await asyncio.to_thread(load_engine)
+        io_settings = allocation_engine.get_io_settings(user_config, individual_toggle.value)
+        if not io_settings["cache_max_bytes"]:
+            # Without the cache Run would parse every file again, so the preview
+            # is left out rather than doubling the read time
+            return
+        for file_path in file_paths:
+            # Missing or unreadable files count as invalid here too and add nothing
+            file_counts = await asyncio.to_thread(allocation_engine.count_evaluator_scripts, file_path, io_settings)
+            # The selection may have changed while this file was being read
+            if file_path in (page.session.get("selected_files") or []):
+                preview_state["counts"][file_path] = file_counts
+                refresh_preview()
+
     # Define toggles
     allow_config_toggle = ft.Switch(value=False, scale=0.6,on_change=lambda e: toggle_percentage_inputs(allow_config_toggle.value))
     # individual_toggle = ft.Switch(value=True, scale=0.6, on_change=lambda e: ensure_one_toggle_active("individual"))
@@ -413,12 +520,12 @@ async def main(page: ft.Page):
     # top_pick_input = percentage_input("Pick", 5, "% booklets from top", on_update_callback=validate_pick_total)
     # middle_pick_input = percentage_input("Pick", 10, "% booklets from middle", on_update_callback=validate_pick_total)
     # bottom_pick_input = percentage_input("Pick", 5, "% booklets from bottom", on_update_callback=validate_pick_total)
-    top_booklet_input = percentage_input("Select top", user_config["top_booklet"], "% booklets", on_update_callback=validate_category_total)
-    middle_booklet_input = percentage_input("Select middle", user_config["middle_booklet"], "% booklets", on_update_callback=validate_category_total)
-    bottom_booklet_input = percentage_input("Select bottom", user_config["bottom_booklet"], "% booklets", on_update_callback=validate_category_total)
-    top_pick_input = percentage_input("Pick", user_config["top_pick"], "% booklets from top", on_update_callback=validate_pick_total)
-    middle_pick_input = percentage_input("Pick", user_config["middle_pick"], "% booklets from middle", on_update_callback=validate_pick_total)
-    bottom_pick_input = percentage_input("Pick", user_config["bottom_pick"], "% booklets from bottom", on_update_callback=validate_pick_total)
+    top_booklet_input = percentage_input("Select top", user_config["top_booklet"], "% booklets", on_update_callback=validate_category_total, on_change_callback=refresh_preview)
+    middle_booklet_input = percentage_input("Select middle", user_config["middle_booklet"], "% booklets", on_update_callback=validate_category_total, on_change_callback=refresh_preview)
+    bottom_booklet_input = percentage_input("Select bottom", user_config["bottom_booklet"], "% booklets", on_update_callback=validate_category_total, on_change_callback=refresh_preview)
+    top_pick_input = percentage_input("Pick", user_config["top_pick"], "% booklets from top", on_update_callback=validate_pick_total, on_change_callback=refresh_preview)
+    middle_pick_input = percentage_input("Pick", user_config["middle_pick"], "% booklets from middle", on_update_callback=validate_pick_total, on_change_callback=refresh_preview)
+    bottom_pick_input = percentage_input("Pick", user_config["bottom_pick"], "% booklets from bottom", on_update_callback=validate_pick_total, on_change_callback=refresh_preview)
 
     categorization_inputs = [top_booklet_input, middle_booklet_input, bottom_booklet_input]
     pick_inputs = [top_pick_input, middle_pick_input, bottom_pick_input]
@@ -459,6 +566,7 @@ async def main(page: ft.Page):
 
     def save_defaults(e):
         config = {
+            **user_config,
             "top_booklet": int(top_booklet_input.value),
             "middle_booklet": int(middle_booklet_input.value),
             "bottom_booklet": int(bottom_booklet_input.value),
@@ -642,6 +750,8 @@ async def main(page: ft.Page):
                         files = [f for f in files if f != chip_ref.data]
                         page.session.set("selected_files", files)
                         update_run_button_label()
+                        preview_state["counts"].pop(chip_ref.data, None)
+                        refresh_preview()
 
                         if not file_chips.controls:
                             chip_scroll_container.border = None
@@ -664,6 +774,10 @@ async def main(page: ft.Page):
 
             page.session.set("selected_files", selected_names)
             update_run_button_label()
+            # Counts are re-read on every pick so edited files are not previewed stale
+            preview_state["counts"].clear()
+            refresh_preview()
+            page.run_task(load_preview_counts, selected_names)
             file_chips.update()
 
             chip_container_box.visible = True
@@ -684,7 +798,7 @@ async def main(page: ft.Page):
     file_picker_button = ft.ElevatedButton(
         text="Browse Files",
         icon=ft.Icons.UPLOAD_FILE,
-        on_click=lambda e: file_picker.pick_files(allow_multiple=True, allowed_extensions=["xlsx"]),
+        on_click=lambda e: file_picker.pick_files(allow_multiple=True, allowed_extensions=["xlsx", "csv", "parquet"]),
         style=ft.ButtonStyle(
             padding=10,
             elevation={"hovered": 6, "pressed": 2, "default": 2, "disabled": 0},
@@ -740,6 +854,8 @@ async def main(page: ft.Page):
         )
     )
     
+    page.add(preview_container)
+
     page.add(ft.Divider(height=5, thickness=0.2, color="grey"))
    
     # Add run button row
@@ -777,8 +893,18 @@ async def main(page: ft.Page):
     )
     page.add(progress_container)
 
-    def add_log_line(message: str):
-        log_list_view.controls.append(ft.Text(message, size=12, selectable=True))
+    log_state = {"pending": [], "flusher": None}
+
+    def flush_log():
+        if not log_state["pending"]:
+            return
+        log_list_view.controls.extend(ft.Text(message, size=12, selectable=True) for message in log_state["pending"])
+        log_state["pending"].clear()
+
+        # Drop the oldest lines so retained controls don't grow across runs
+        overflow = len(log_list_view.controls) - MAX_LOG_LINES
+        if overflow > 0:
+            del log_list_view.controls[:overflow]
 
         # Limit visible height to max 5 rows (~24px each)
         if len(log_list_view.controls) > 5:
@@ -789,9 +915,29 @@ async def main(page: ft.Page):
         log_list_view.visible = True
         log_scroll_view.visible = True
 
-        log_list_view.update()
+        # One round-trip for the whole batch; updating the container includes the list
         log_scroll_view.update()
 
+    def add_log_line(message: str):
+        log_state["pending"].append(message)
+        if len(log_state["pending"]) >= LOG_FLUSH_LINES:
+            flush_log()
+
+    async def flush_log_periodically():
+        while True:
+            await asyncio.sleep(LOG_FLUSH_INTERVAL)
+            flush_log()
+
+    def start_log_flusher():
+        stop_log_flusher()
+        log_state["flusher"] = asyncio.create_task(flush_log_periodically())
+
+    def stop_log_flusher():
+        if log_state["flusher"] is not None:
+            log_state["flusher"].cancel()
+            log_state["flusher"] = None
+        flush_log()
+
 
     log_list_view = ft.ListView(
         controls=[],
@@ -820,6 +966,10 @@ async def main(page: ft.Page):
             run_spacing=10
         )
     )
+    report_startup("first paint")
+
+    # Import the engine while the user is still picking files
+    asyncio.get_running_loop().run_in_executor(None, warm_up_engine)
 
     async def collect_alternate_moderator():
         # To store user input
@@ -893,216 +1043,114 @@ async def main(page: ft.Page):
 
     async def process_test(
             file_path: str,
-            top_selected_booklets: int,
-            middle_selected_booklets: int,
-            bottom_selected_booklets: int,
-            top_picked_booklets: int,
-            middle_picked_booklets: int,
-            bottom_picked_booklets: int,
-            individual_files: bool,
+            result: dict,
+            io_settings: dict,
             bulk_file: bool
         ):
 
         global count_unusual_evaluation_cycle_files
         global count_successfully_processed_files
         global skip_processing_current_file
-        global master_bulk_allocation_df
-
-        # skip_processing_current_file = False
+        global master_bulk_allocation
 
-        print(f"Started processing: {os.path.splitext(os.path.basename(file_path))[0]}")
-        print(f"Selected Booklets => Top: {top_selected_booklets}%, Middle: {middle_selected_booklets}%, Bottom: {bottom_selected_booklets}%")
-        print(f"Picked Booklets => Top: {top_picked_booklets}%, Middle: {middle_picked_booklets}%, Bottom: {bottom_picked_booklets}%")
-        print(f"Output Options => Individual Files: {individual_files}, Bulk File: {bulk_file}")
+        skip_processing_current_file = False
 
-        df = pd.read_excel(file_path, dtype={'Registration Number': str})
-        invalid_cycles = df[~df['Cycle'].isin(['primary', '-'])]
-        # global count_unusual_evaluation_cycle_files
-        if not invalid_cycles.empty:
+        if result["status"] == "unusual_cycle":
             list_unusual_evaluation_cycle_files.add(os.path.splitext(os.path.basename(file_path))[0])
             count_unusual_evaluation_cycle_files += 1
-            add_log_line(f"{" " * 8}⛔ Skipped processing. Found invalid cycles: {', '.join(invalid_cycles['Cycle'].unique())}")
-        else:
-            add_log_line(f"{" " * 8}✅ No invalid evaluation cycle found.")
-            df = df[df['Cycle'] == 'primary'].copy()
-            total_evaluators = df['Evaluated By'].nunique()
-            total_scripts = len(df)
-            print(f'Total Scripts: {len(df)}')
-            print(f'Total Evaluators: {total_evaluators}')
-
-            # Use values from GUI
-            top_count = math.ceil(total_scripts * top_picked_booklets / 100)
-            middle_count = math.ceil(total_scripts * middle_picked_booklets / 100)
-            bottom_count = math.ceil(total_scripts * bottom_picked_booklets / 100)
-
-            sorted_data = df.sort_values(by=['Evaluated By', 'Total Marks'], ascending=[True, False])
-            sorted_data = sorted_data.reset_index(drop=True)
-            sorted_data['Scoring Category'] = None
-            sorted_data['Selected for Moderation'] = 'Not Selected'
-
-            unique_evaluators = sorted_data['Evaluated By'].unique()
-
-            for evaluator in unique_evaluators:
-                evaluator_data = sorted_data[sorted_data['Evaluated By'] == evaluator]
-                total_scripts_evaluator = len(evaluator_data)
-                top_count = math.ceil(total_scripts_evaluator * top_selected_booklets / 100)
-                bottom_count = math.ceil(total_scripts_evaluator * bottom_selected_booklets / 100)
-
-                sorted_data.loc[evaluator_data.index[:top_count], 'Scoring Category'] = f'Top {top_selected_booklets}%'
-                sorted_data.loc[evaluator_data.index[-bottom_count:], 'Scoring Category'] = f'Bottom {bottom_selected_booklets}%'
-                sorted_data.loc[
-                    evaluator_data.index[top_count:total_scripts_evaluator - bottom_count],
-                    'Scoring Category'
-                ] = f'Middle {middle_selected_booklets}%'
-
-            for evaluator in unique_evaluators:
-                evaluator_data = sorted_data[sorted_data['Evaluated By'] == evaluator]
-                total_scripts_evaluator = len(evaluator_data)
-                for category, pick_percent in zip(
-                    [f'Top {top_selected_booklets}%', f'Middle {middle_selected_booklets}%', f'Bottom {bottom_selected_booklets}%'],
-                    [top_picked_booklets, middle_picked_booklets, bottom_picked_booklets]
-                ):
-                    # Calculate the pick count as a % of *total scripts for this evaluator*
-                    pick_count = math.ceil(total_scripts_evaluator * pick_percent / 100)
-                    category_rows = evaluator_data[evaluator_data['Scoring Category'] == category]
-                    # Only pick as many as available in that category
-                    if pick_count > 0 and not category_rows.empty:
-                        selected_indices = category_rows.sample(
-                            min(len(category_rows), pick_count), random_state=42
-                        ).index
-                        sorted_data.loc[selected_indices, 'Selected for Moderation'] = 'Selected'
-
-
-            sorted_data['Moderator'] = None
-            evaluator_pool = sorted_data['Evaluated By'].unique().tolist()
-
-            if len(evaluator_pool) == 1:
-                global sole_evaluator
-                sole_evaluator = evaluator_pool[0]
-                add_log_line(f"{" " * 8}⚠️ Single evaluator found: {', '.join(evaluator_pool)}")
-
-                async def alternate_evaluator_required():
+            add_log_line(f"{" " * 8}⛔ Skipped processing. Found invalid cycles: {', '.join(result['invalid_cycles'])}")
+            return result
+
+        add_log_line(f"{" " * 8}✅ No invalid evaluation cycle found.")
+
+        if result["status"] == "single_evaluator":
+            sorted_data = result["sorted_data"]
+            global sole_evaluator
+            sole_evaluator = result["sole_evaluator"]
+            add_log_line(f"{" " * 8}⚠️ Single evaluator found: {sole_evaluator}")
+
+            async def alternate_evaluator_required():
+                global alternate_eval_choice
+                future = asyncio.Future()
+                alternate_evaluator_required_dialogue = ft.AlertDialog()
+
+                async def handle_click(e):
                     global alternate_eval_choice
-                    future = asyncio.Future()
-                    alternate_evaluator_required_dialogue = ft.AlertDialog()
-
-                    async def handle_click(e):
-                        global alternate_eval_choice
-                        global sole_evaluator
-                        global skip_processing_current_file
-                        global count_user_skipped_files
-                        if e.control.data == "sameEvaluator":
-                            add_log_line(f"{" " * 8}✅ User chose to assign same evaluator: {sole_evaluator}")
-                            alternate_evaluator_required_dialogue.open = False
-                            moderator_mapping = {sole_evaluator: sole_evaluator}
-                            sorted_data['Moderator'] = sorted_data['Evaluated By'].map(moderator_mapping)
-                            page.update()
-                            future.set_result(alternate_eval_choice)
+                    global sole_evaluator
+                    global skip_processing_current_file
+                    global count_user_skipped_files
+                    if e.control.data == "sameEvaluator":
+                        add_log_line(f"{" " * 8}✅ User chose to assign same evaluator: {sole_evaluator}")
+                        alternate_evaluator_required_dialogue.open = False
+                        moderator_mapping = {sole_evaluator: sole_evaluator}
+                        sorted_data['Moderator'] = sorted_data['Evaluated By'].map(moderator_mapping)
+                        page.update()
+                        future.set_result(alternate_eval_choice)
+                    
+                    elif e.control.data == "assignOtherEvaluator":
+                        alternate_evaluator_required_dialogue.open = False
+                        page.update()
+                        add_log_line(f"{" " * 8}✅ User chose to assign different evaluator")
+                        moderator_id = await collect_alternate_moderator()
                         
-                        elif e.control.data == "assignOtherEvaluator":
-                            alternate_evaluator_required_dialogue.open = False
-                            page.update()
-                            add_log_line(f"{" " * 8}✅ User chose to assign different evaluator")
-                            moderator_id = await collect_alternate_moderator()
-                            
-                            if moderator_id:
-                                moderator_mapping = {sole_evaluator: moderator_id}
-                                sorted_data['Moderator'] = sorted_data['Evaluated By'].map(moderator_mapping)
-                                add_log_line(f"{" " * 8}✅ User entered new moderator ID: {moderator_id}")
-                            else:
-                                skip_processing_current_file = True
-                                count_user_skipped_files += 1
-                                list_user_skipped_files.add(os.path.splitext(os.path.basename(file_path))[0])
-                                add_log_line(f"{" " * 8}⛔ User cancelled entering moderator ID.")
-                                # alternate_eval_choice = None
-
-                            future.set_result(alternate_eval_choice)
-
-                        elif e.control.data == "skipProccessing":
+                        if moderator_id:
+                            moderator_mapping = {sole_evaluator: moderator_id}
+                            sorted_data['Moderator'] = sorted_data['Evaluated By'].map(moderator_mapping)
+                            add_log_line(f"{" " * 8}✅ User entered new moderator ID: {moderator_id}")
+                        else:
+                            skip_processing_current_file = True
                             count_user_skipped_files += 1
                             list_user_skipped_files.add(os.path.splitext(os.path.basename(file_path))[0])
-                            add_log_line(f"{" " * 8}⛔ User chose to skip processing the file")
-                            skip_processing_current_file = True
-                            print(f"Skip Processing_current file: {skip_processing_current_file}")
-                            alternate_evaluator_required_dialogue.open = False
-                            page.update()
-                            future.set_result(alternate_eval_choice)
-
-
-                    alternate_evaluator_required_dialogue.title = ft.Text("Oops!!! No alternate moderator available.", weight=ft.FontWeight.W_500)
-                    alternate_evaluator_required_dialogue.content = ft.Text("Choose an option to proceed:", size=14, weight=ft.FontWeight.W_500)
-                    alternate_evaluator_required_dialogue.actions = [
-                        ft.ElevatedButton("Assign Same Evaluator", data="sameEvaluator", on_click=handle_click),
-                        ft.ElevatedButton("Assign New Moderator", data="assignOtherEvaluator", on_click=handle_click),
-                        ft.ElevatedButton("Skip Processing", data="skipProccessing", on_click=handle_click),
-                    ]
-                    alternate_evaluator_required_dialogue.actions_alignment = ft.MainAxisAlignment.END
-
-                    page.dialog = alternate_evaluator_required_dialogue
-                    page.open(alternate_evaluator_required_dialogue)
-                    page.update()
-                    return await future
-
-                await alternate_evaluator_required()
-            
-            else:
-                add_log_line(f"{" " * 8}✅ Multiple evaluators found, good to go.")
-                random.shuffle(evaluator_pool)
-                remaining_moderators = evaluator_pool.copy()
-                moderator_mapping = {}
-
-                for evaluator in evaluator_pool:
-                    available_moderators = [mod for mod in remaining_moderators if mod != evaluator]
-                    if available_moderators:
-                        moderator = random.choice(available_moderators)
-                        moderator_mapping[evaluator] = moderator
-                        remaining_moderators.remove(moderator)
-
-                sorted_data['Moderator'] = sorted_data['Evaluated By'].map(moderator_mapping)
-
-            selected_filter = sorted_data[sorted_data['Selected for Moderation'] == 'Selected']
-
-            allocation_summary_df = pd.pivot_table(
-                selected_filter,
-                index=['Evaluated By', 'Scoring Category'],
-                values='Total Marks',
-                aggfunc={'Total Marks': ['min', 'max']}
-            ).reset_index()
-
-            allocation_summary_df.columns = [
-                col.replace("max", "Max Marks").replace("min", "Min Marks") if isinstance(col, str) else col
-                for col in allocation_summary_df.columns
-            ]
-            allocation_summary_df = allocation_summary_df[['Evaluated By', 'Scoring Category', 'Min Marks', 'Max Marks']]
-
-            bulk_allocation_df = sorted_data[sorted_data['Selected for Moderation'] == 'Selected'][['Schedule Id', 'Email of the student', 'Moderator']].copy()
-            bulk_allocation_df.rename(columns={
-                'Schedule Id': 'Test Id',
-                'Email of the student': 'User Id',
-                'Moderator': 'Evaluator Ids'
-            }, inplace=True)
-
-            if skip_processing_current_file == False:
-                if individual_files:
-                    dir_path = os.path.dirname(file_path)
-                    filename = f'bulk_allocation_{os.path.basename(file_path)}'
-                    output_file = os.path.join(dir_path, f'{filename}')
-                    with pd.ExcelWriter(output_file, engine='openpyxl') as writer:
-                        bulk_allocation_df.to_excel(writer, sheet_name='BulkAllocation', index=False)
-                        sorted_data.to_excel(writer, sheet_name='MasterAllocationData', index=False)
-                        allocation_summary_df.to_excel(writer, sheet_name='AllocationSummary', index=False)
-                    add_log_line(f"{" " * 8}✅ File successfully procesed and saved at {os.path.basename(file_path)}")
-                    count_successfully_processed_files +=1
-                    list_successfully_processed_files.add(os.path.basename(file_path))
-                elif not individual_files:
-                    add_log_line(f"{" " * 8}✅ File Procesed but individual file not saved as per user choice")
-                    count_successfully_processed_files +=1
-                    list_successfully_processed_files.add(os.path.basename(file_path))
-
-            if bulk_file:
-                if master_bulk_allocation_df.empty:
-                    master_bulk_allocation_df = bulk_allocation_df.copy()
-                else:
-                    master_bulk_allocation_df = pd.concat([master_bulk_allocation_df, bulk_allocation_df], ignore_index=True)
+                            add_log_line(f"{" " * 8}⛔ User cancelled entering moderator ID.")
+                            # alternate_eval_choice = None
+
+                        future.set_result(alternate_eval_choice)
+
+                    elif e.control.data == "skipProccessing":
+                        count_user_skipped_files += 1
+                        list_user_skipped_files.add(os.path.splitext(os.path.basename(file_path))[0])
+                        add_log_line(f"{" " * 8}⛔ User chose to skip processing the file")
+                        skip_processing_current_file = True
+                        print(f"Skip Processing_current file: {skip_processing_current_file}")
+                        alternate_evaluator_required_dialogue.open = False
+                        page.update()
+                        future.set_result(alternate_eval_choice)
+
+
+                alternate_evaluator_required_dialogue.title = ft.Text("Oops!!! No alternate moderator available.", weight=ft.FontWeight.W_500)
+                alternate_evaluator_required_dialogue.content = ft.Text("Choose an option to proceed:", size=14, weight=ft.FontWeight.W_500)
+                alternate_evaluator_required_dialogue.actions = [
+                    ft.ElevatedButton("Assign Same Evaluator", data="sameEvaluator", on_click=handle_click),
+                    ft.ElevatedButton("Assign New Moderator", data="assignOtherEvaluator", on_click=handle_click),
+                    ft.ElevatedButton("Skip Processing", data="skipProccessing", on_click=handle_click),
+                ]
+                alternate_evaluator_required_dialogue.actions_alignment = ft.MainAxisAlignment.END
+
+                page.dialog = alternate_evaluator_required_dialogue
+                page.open(alternate_evaluator_required_dialogue)
+                page.update()
+                return await future
+
+            await alternate_evaluator_required()
+
+            if skip_processing_current_file:
+                return result
+
+            result = await asyncio.to_thread(load_engine().finish_allocation, file_path, sorted_data, io_settings, result["stages"])
+        else:
+            add_log_line(f"{" " * 8}✅ Multiple evaluators found, good to go.")
+
+        if io_settings["individual_files"]:
+            add_log_line(f"{" " * 8}✅ File successfully procesed and saved at {os.path.basename(file_path)}")
+        else:
+            add_log_line(f"{" " * 8}✅ File Procesed but individual file not saved as per user choice")
+        count_successfully_processed_files +=1
+        list_successfully_processed_files.add(os.path.basename(file_path))
+
+        if bulk_file:
+            await asyncio.to_thread(master_bulk_allocation.append, result["bulk_allocation_df"])
+        return result
 
-ft.app(target=main)
+if __name__ == "__main__":
+    # Worker processes re-import this module; only the parent starts the UI
+    ft.app(target=main)
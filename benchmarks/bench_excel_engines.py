@@ -0,0 +1,74 @@
+"""Time every installed Excel read/write engine on a synthetic exam export.
+
+Usage: python benchmarks/bench_excel_engines.py [--rows 100000] [--workdir DIR]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from allocation_engine import (  # noqa: E402
+    EXCEL_READ_ENGINES,
+    EXCEL_WRITE_ENGINES,
+    StreamingWorkbook,
+    is_engine_available,
+)
+from synthetic_export import generate_export  # noqa: E402
+
+
+def timed(func):
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--workdir", default=None)
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="excel_engines_")
+    data = generate_export(args.rows, non_primary=0)
+    print(f"{args.rows} rows x {len(data.columns)} columns, files in {workdir}")
+
+    print("\nWrite (DataFrame.to_excel)")
+    written = {}
+    for engine in EXCEL_WRITE_ENGINES:
+        if not is_engine_available(engine):
+            print(f"  {engine:<12} not installed")
+            continue
+        path = os.path.join(workdir, f"sample_{engine}.xlsx")
+        seconds = timed(lambda: data.to_excel(path, index=False, engine=engine))
+        written[engine] = path
+        print(f"  {engine:<12} {seconds:8.2f} s")
+
+    print("\nWrite (StreamingWorkbook)")
+    for engine in EXCEL_WRITE_ENGINES:
+        if not is_engine_available(engine):
+            continue
+        path = os.path.join(workdir, f"streamed_{engine}.xlsx")
+
+        def stream():
+            workbook = StreamingWorkbook(path, engine)
+            workbook.append_frame("Sheet1", workbook.add_sheet("Sheet1"), data)
+            workbook.save()
+
+        print(f"  {engine:<12} {timed(stream):8.2f} s")
+
+    print("\nRead (pd.read_excel)")
+    source = next(iter(written.values()))
+    for engine in EXCEL_READ_ENGINES:
+        if not is_engine_available(engine):
+            print(f"  {engine:<12} not installed")
+            continue
+        seconds = timed(lambda: pd.read_excel(source, engine=engine))
+        print(f"  {engine:<12} {seconds:8.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""Time each stage of a single-file allocation on synthetic exports of several sizes.
+
+Usage: python benchmarks/bench_stages.py [--rows 10000 100000 1000000] [--format xlsx]
+       [--evaluators 200] [--repeat 1] [--reference-max-rows 100000] [--workdir DIR]
+
+Stages follow allocate_file: read, filter, sort, categorize, sample, assign
+moderators, pivot and write. Up to --reference-max-rows, the original
+per-evaluator loops from reference_allocation.py are timed alongside.
+Generating and writing the input file is not timed.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from allocation_engine import (  # noqa: E402
+    INPUT_FORMATS,
+    assign_scoring_categories,
+    build_allocation_outputs,
+    build_moderator_mapping,
+    filter_primary_rows,
+    get_category_labels,
+    get_io_settings,
+    load_input_file,
+    select_for_moderation,
+    sort_by_evaluator,
+    write_allocation_file,
+)
+from moderator_config import default_config  # noqa: E402
+from reference_allocation import (  # noqa: E402
+    reference_categorize,
+    reference_moderator_mapping,
+    reference_outputs,
+    reference_sample,
+)
+from synthetic_export import generate_export, write_export  # noqa: E402
+
+STAGES = ["read", "filter", "sort", "categorize", "sample", "assign moderators", "pivot", "write"]
+BOOKLET_SPLIT = [20, 40, 40]
+PICK_PERCENTS = [5, 10, 5]
+
+
+def run_engine_stages(input_path, output_base, io_settings):
+    timings = {}
+
+    def stage(name, func, *args):
+        start = time.perf_counter()
+        result = func(*args)
+        timings[name] = time.perf_counter() - start
+        return result
+
+    data, _ = stage("read", load_input_file, input_path, io_settings["read_engine"], io_settings["input_columns"])
+    primary = stage("filter", filter_primary_rows, data)
+    sorted_data = stage("sort", sort_by_evaluator, primary)
+    sorted_data = stage("categorize", assign_scoring_categories, sorted_data, *BOOKLET_SPLIT)
+    sorted_data = stage("sample", select_for_moderation, sorted_data, get_category_labels(*BOOKLET_SPLIT), PICK_PERCENTS)
+
+    def assign_moderators():
+        moderator_mapping = build_moderator_mapping(sorted_data['Evaluated By'].unique().tolist(), 0)
+        sorted_data['Moderator'] = sorted_data['Evaluated By'].map(moderator_mapping)
+
+    stage("assign moderators", assign_moderators)
+    bulk_allocation_df, allocation_summary_df = stage("pivot", build_allocation_outputs, sorted_data)
+    stage("write", write_allocation_file, output_base, bulk_allocation_df, sorted_data, allocation_summary_df, io_settings)
+    return timings
+
+
+def run_reference_stages(data):
+    # read, filter, sort and write were the same calls before, so only the loops are timed
+    timings = {}
+    start = time.perf_counter()
+    sorted_data = reference_categorize(data, *BOOKLET_SPLIT)
+    timings["categorize"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    sorted_data = reference_sample(sorted_data, *BOOKLET_SPLIT, *PICK_PERCENTS)
+    timings["sample"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    sorted_data['Moderator'] = sorted_data['Evaluated By'].map(reference_moderator_mapping(sorted_data['Evaluated By'].unique().tolist()))
+    timings["assign moderators"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    reference_outputs(sorted_data)
+    timings["pivot"] = time.perf_counter() - start
+    return timings
+
+
+def best_of(repeat, func, *args):
+    runs = [func(*args) for _ in range(repeat)]
+    return {name: min(run[name] for run in runs) for name in runs[0]}
+
+
+def print_table(title, results):
+    print(f"\n{title}")
+    print(f"  {'stage':<18}" + "".join(f"{rows:>12,}" for rows in results))
+    for name in STAGES:
+        cells = [results[rows].get(name) for rows in results]
+        if any(cell is not None for cell in cells):
+            print(f"  {name:<18}" + "".join(f"{cell:>11.3f}s" if cell is not None else f"{'-':>12}" for cell in cells))
+    print(f"  {'total':<18}" + "".join(f"{sum(timings.values()):>11.3f}s" for timings in results.values()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--format", choices=sorted(set(INPUT_FORMATS.values())), default="xlsx")
+    parser.add_argument("--evaluators", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=1, help="keep the best of this many runs")
+    parser.add_argument("--reference-max-rows", type=int, default=100_000)
+    parser.add_argument("--workdir", default=None)
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="allocation_stages_")
+    os.makedirs(workdir, exist_ok=True)
+    io_settings = get_io_settings(dict(default_config), individual_files=True)
+    print(f"Engines: read {io_settings['read_engine']}, write {io_settings['write_engine']}; files in {workdir}")
+
+    engine_results, reference_results = {}, {}
+    for rows in args.rows:
+        data = generate_export(rows, evaluators=args.evaluators)
+        input_path = os.path.join(workdir, f"export_{rows}.{args.format}")
+        write_export(data, input_path)
+        print(f"  {rows:,} rows generated")
+
+        engine_results[rows] = best_of(args.repeat, run_engine_stages, input_path, os.path.join(workdir, f"bulk_allocation_{rows}"), io_settings)
+        if rows <= args.reference_max_rows:
+            reference_results[rows] = best_of(args.repeat, run_reference_stages, data)
+
+    print_table("Engine", engine_results)
+    if reference_results:
+        print_table("Original loops", reference_results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""Check the vectorised allocation engine against the original per-evaluator loops.
+
+Usage: python benchmarks/check_golden.py [--rows 5000] [--cases 20] [--seed 0]
+
+Every case draws a fresh synthetic export and random percentages, then compares:
+row order and Scoring Category row for row, selected counts per evaluator and
+category, the moderator mapping, the BulkAllocation frame, and AllocationSummary's
+marks and per-category script counts and mark ranges.
+Sampling moved from one DataFrame.sample per group to a single seeded shuffle, so
+selections are compared by count, not by which rows were drawn. Exits non-zero on
+any mismatch.
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from allocation_engine import (  # noqa: E402
+    assign_scoring_categories,
+    build_allocation_outputs,
+    build_moderator_mapping,
+    filter_primary_rows,
+    find_invalid_cycles,
+    get_category_labels,
+    select_for_moderation,
+    sort_by_evaluator,
+    to_output_frame,
+)
+from reference_allocation import reference_categorize, reference_outputs, reference_sample  # noqa: E402
+from synthetic_export import MARK_DISTRIBUTIONS, generate_export  # noqa: E402
+
+
+def random_case(rng, rows):
+    # The reference labels every row Bottom when the bottom slice is 0%, so the
+    # bottom percentage is kept at 1% or more
+    top = int(rng.integers(0, 99))
+    bottom = int(rng.integers(1, 101 - top))
+    picks = [int(pick) for pick in rng.integers(0, 34, 3)]
+    # Small exports with many evaluators leave one to a few scripts each, where
+    # the rounding rules matter most; the reference loops are too slow to do
+    # that at full size
+    export = {
+        "rows": int(rng.choice([rows, 300])),
+        "evaluators": int(rng.choice([2, 5, 40, 200])),
+        "skew": float(rng.choice([0.0, 1.0, 1.5])),
+        "marks": str(rng.choice(MARK_DISTRIBUTIONS)),
+        "non_primary": float(rng.choice([0.0, 0.05])),
+        "seed": int(rng.integers(0, 2**31)),
+    }
+    return export, [top, 100 - top - bottom, bottom], picks
+
+
+def selected_counts(frame, selected):
+    counts = selected.groupby([frame['Evaluated By'].astype(object), frame['Scoring Category'].astype(object)]).sum()
+    return counts[counts > 0].sort_index()
+
+
+def check_case(data, booklet_split, pick_percents, seed):
+    problems = []
+
+    reference = reference_categorize(data, *booklet_split)
+    sorted_data = assign_scoring_categories(sort_by_evaluator(filter_primary_rows(data)), *booklet_split)
+    if not np.array_equal(reference['Script Id'].to_numpy(), sorted_data['Script Id'].to_numpy()):
+        problems.append("row order differs")
+    elif not (reference['Scoring Category'].to_numpy() == sorted_data['Scoring Category'].astype(object).to_numpy()).all():
+        problems.append("scoring categories differ")
+
+    reference = reference_sample(reference, *booklet_split, *pick_percents)
+    sorted_data = select_for_moderation(sorted_data, get_category_labels(*booklet_split), pick_percents, seed=seed)
+    expected = selected_counts(reference, reference['Selected for Moderation'] == 'Selected')
+    actual = selected_counts(sorted_data, sorted_data['Selected for Moderation'])
+    if not expected.equals(actual):
+        problems.append("selected counts per evaluator and category differ")
+
+    evaluator_pool = sorted_data['Evaluated By'].unique().tolist()
+    moderator_mapping = build_moderator_mapping(evaluator_pool, seed)
+    if len(evaluator_pool) > 1 and (
+        sorted(moderator_mapping) != sorted(evaluator_pool)
+        or sorted(moderator_mapping.values()) != sorted(evaluator_pool)
+        or any(evaluator == moderator for evaluator, moderator in moderator_mapping.items())
+    ):
+        problems.append("moderator mapping is not a derangement of the evaluators")
+    sorted_data['Moderator'] = sorted_data['Evaluated By'].map(moderator_mapping)
+
+    # Same selection through both output builders
+    bulk_allocation_df, allocation_summary_df = build_allocation_outputs(sorted_data)
+    reference_bulk, reference_summary = reference_outputs(
+        to_output_frame(sorted_data).astype({'Evaluated By': object, 'Scoring Category': object, 'Moderator': object})
+    )
+    # The summary now lists every category, not only those with a selection, and
+    # adds columns; the reference covers the original four
+    summary_keys = ['Evaluated By', 'Scoring Category']
+    picked_summary = allocation_summary_df[allocation_summary_df['Selected'] > 0].reset_index(drop=True)
+    category_stats = reference.groupby(summary_keys)['Total Marks'].agg(['size', 'min', 'max']).reset_index()
+    category_stats.columns = summary_keys + ['Scripts', 'Category Min Marks', 'Category Max Marks']
+    try:
+        pd.testing.assert_frame_equal(bulk_allocation_df, reference_bulk, check_dtype=False)
+        pd.testing.assert_frame_equal(picked_summary[reference_summary.columns], reference_summary, check_dtype=False)
+        pd.testing.assert_frame_equal(allocation_summary_df[category_stats.columns], category_stats, check_dtype=False)
+    except AssertionError as e:
+        problems.append(f"output frames differ: {e}")
+
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=5_000)
+    parser.add_argument("--cases", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    failures = 0
+
+    unusual = generate_export(1_000, unusual_cycles=3, seed=args.seed)
+    expected_cycles = unusual[~unusual['Cycle'].isin(['primary', '-'])]['Cycle'].unique().tolist()
+    if find_invalid_cycles(unusual) != expected_cycles:
+        print("FAIL unusual cycle detection")
+        failures += 1
+
+    for case in range(1, args.cases + 1):
+        export, booklet_split, pick_percents = random_case(rng, args.rows)
+        data = generate_export(**export)
+        problems = check_case(data, booklet_split, pick_percents, seed=export["seed"])
+        status = "FAIL" if problems else "ok  "
+        print(f"{status} case {case:3d}: split {booklet_split}, picks {pick_percents}, {export}")
+        for problem in problems:
+            print(f"       {problem}")
+        failures += bool(problems)
+
+    print(f"\n{failures} mismatch(es)" if failures else f"\nAll {args.cases} cases match")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
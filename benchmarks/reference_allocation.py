@@ -0,0 +1,104 @@
+"""The original per-evaluator loops from process_test, kept as the behaviour to match.
+
+Nothing in the app imports this module; check_golden.py and bench_stages.py compare
+the vectorised engine against it. Keep it as it was, quirks included.
+"""
+import math
+import random
+
+import pandas as pd
+
+
+def reference_categorize(df, top_selected_booklets, middle_selected_booklets, bottom_selected_booklets):
+    df = df[df['Cycle'] == 'primary'].copy()
+    sorted_data = df.sort_values(by=['Evaluated By', 'Total Marks'], ascending=[True, False])
+    sorted_data = sorted_data.reset_index(drop=True)
+    sorted_data['Scoring Category'] = None
+    sorted_data['Selected for Moderation'] = 'Not Selected'
+
+    for evaluator in sorted_data['Evaluated By'].unique():
+        evaluator_data = sorted_data[sorted_data['Evaluated By'] == evaluator]
+        total_scripts_evaluator = len(evaluator_data)
+        top_count = math.ceil(total_scripts_evaluator * top_selected_booklets / 100)
+        bottom_count = math.ceil(total_scripts_evaluator * bottom_selected_booklets / 100)
+
+        # With a 0% bottom slice, index[-0:] is every row: the original labels the
+        # whole block Bottom here, which the engine deliberately does not copy
+        sorted_data.loc[evaluator_data.index[:top_count], 'Scoring Category'] = f'Top {top_selected_booklets}%'
+        sorted_data.loc[evaluator_data.index[-bottom_count:], 'Scoring Category'] = f'Bottom {bottom_selected_booklets}%'
+        sorted_data.loc[
+            evaluator_data.index[top_count:total_scripts_evaluator - bottom_count],
+            'Scoring Category'
+        ] = f'Middle {middle_selected_booklets}%'
+
+    return sorted_data
+
+
+def reference_sample(
+        sorted_data,
+        top_selected_booklets,
+        middle_selected_booklets,
+        bottom_selected_booklets,
+        top_picked_booklets,
+        middle_picked_booklets,
+        bottom_picked_booklets
+    ):
+    for evaluator in sorted_data['Evaluated By'].unique():
+        evaluator_data = sorted_data[sorted_data['Evaluated By'] == evaluator]
+        total_scripts_evaluator = len(evaluator_data)
+        for category, pick_percent in zip(
+            [f'Top {top_selected_booklets}%', f'Middle {middle_selected_booklets}%', f'Bottom {bottom_selected_booklets}%'],
+            [top_picked_booklets, middle_picked_booklets, bottom_picked_booklets]
+        ):
+            pick_count = math.ceil(total_scripts_evaluator * pick_percent / 100)
+            category_rows = evaluator_data[evaluator_data['Scoring Category'] == category]
+            if pick_count > 0 and not category_rows.empty:
+                selected_indices = category_rows.sample(
+                    min(len(category_rows), pick_count), random_state=42
+                ).index
+                sorted_data.loc[selected_indices, 'Selected for Moderation'] = 'Selected'
+
+    return sorted_data
+
+
+def reference_moderator_mapping(evaluator_pool):
+    # Can leave the last evaluator unmapped when only they remain
+    evaluator_pool = list(evaluator_pool)
+    random.shuffle(evaluator_pool)
+    remaining_moderators = evaluator_pool.copy()
+    moderator_mapping = {}
+
+    for evaluator in evaluator_pool:
+        available_moderators = [mod for mod in remaining_moderators if mod != evaluator]
+        if available_moderators:
+            moderator = random.choice(available_moderators)
+            moderator_mapping[evaluator] = moderator
+            remaining_moderators.remove(moderator)
+
+    return moderator_mapping
+
+
+def reference_outputs(sorted_data):
+    selected_filter = sorted_data[sorted_data['Selected for Moderation'] == 'Selected']
+
+    allocation_summary_df = pd.pivot_table(
+        selected_filter,
+        index=['Evaluated By', 'Scoring Category'],
+        values='Total Marks',
+        aggfunc={'Total Marks': ['min', 'max']}
+    ).reset_index()
+
+    allocation_summary_df.columns = [
+        col.replace("max", "Max Marks").replace("min", "Min Marks") if isinstance(col, str) else col
+        for col in allocation_summary_df.columns
+    ]
+    allocation_summary_df = allocation_summary_df[['Evaluated By', 'Scoring Category', 'Min Marks', 'Max Marks']]
+
+    bulk_allocation_df = sorted_data[sorted_data['Selected for Moderation'] == 'Selected'][['Schedule Id', 'Email of the student', 'Moderator']].copy()
+    bulk_allocation_df.rename(columns={
+        'Schedule Id': 'Test Id',
+        'Email of the student': 'User Id',
+        'Moderator': 'Evaluator Ids'
+    }, inplace=True)
+
+    return bulk_allocation_df, allocation_summary_df
@@ -0,0 +1,127 @@
+"""Generate synthetic exam exports with every required column and no real student data.
+
+Usage: python benchmarks/synthetic_export.py OUTPUT [--rows 100000] [--evaluators 200]
+       [--skew 1.0] [--marks normal] [--non-primary 0.02] [--unusual-cycles 0]
+       [--schedules 1] [--seed 0]
+
+The output format follows the extension of OUTPUT (.xlsx, .csv or .parquet).
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from allocation_engine import REQUIRED_COLUMNS, detect_input_format  # noqa: E402
+
+MARK_DISTRIBUTIONS = ["normal", "uniform", "bimodal"]
+
+
+def evaluator_weights(evaluators, skew):
+    # Zipf-like: evaluator k marks about 1 / k**skew of the scripts, so 0 is an even split
+    weights = 1.0 / np.arange(1, evaluators + 1) ** skew
+    return weights / weights.sum()
+
+
+def draw_marks(rng, distribution, evaluator_codes, evaluators, max_marks):
+    rows = len(evaluator_codes)
+    if distribution == "uniform":
+        marks = rng.uniform(0, max_marks, rows)
+    elif distribution == "bimodal":
+        low = rng.normal(0.35 * max_marks, 0.1 * max_marks, rows)
+        high = rng.normal(0.75 * max_marks, 0.1 * max_marks, rows)
+        marks = np.where(rng.random(rows) < 0.4, low, high)
+    else:
+        # Each evaluator is a little more lenient or strict than the rest
+        leniency = rng.normal(0, 0.05 * max_marks, evaluators)
+        marks = rng.normal(0.6 * max_marks, 0.15 * max_marks, rows) + leniency[evaluator_codes]
+    # Half marks are common, so ties inside an evaluator's block are realistic
+    return np.clip(np.round(marks * 2) / 2, 0, max_marks)
+
+
+def generate_export(
+        rows,
+        evaluators=200,
+        skew=1.0,
+        marks="normal",
+        max_marks=100,
+        non_primary=0.02,
+        unusual_cycles=0,
+        schedules=1,
+        seed=0
+    ):
+    rng = np.random.default_rng(seed)
+    evaluator_emails = np.array([f"evaluator{i}@example.com" for i in range(evaluators)], dtype=object)
+    evaluator_codes = rng.choice(evaluators, size=rows, p=evaluator_weights(evaluators, skew))
+    schedule_ids = 1001 + rng.integers(0, schedules, rows)
+
+    data = pd.DataFrame({
+        "Register Number": [f"REG{i:08d}" for i in range(rows)],
+        "Name of the student": [f"Student {i}" for i in range(rows)],
+        "Schedule Id": schedule_ids,
+        "Schedule Name": [f"Sample Schedule {schedule_id}" for schedule_id in schedule_ids],
+        "Email of the student": [f"student{i}@example.com" for i in range(rows)],
+        "Total Marks": draw_marks(rng, marks, evaluator_codes, evaluators, max_marks),
+        "Exam Appearance Status": "Appeared",
+        "Evaluated By": evaluator_emails[evaluator_codes],
+        "Evaluator Id": [f"EV{code:05d}" for code in evaluator_codes],
+        "Script Id": rng.permutation(rows) + 1,
+        "Cycle": "primary",
+    })
+
+    # Absent students are exported with '-' as the cycle and nobody evaluating them
+    absent = rng.random(rows) < non_primary
+    data.loc[absent, ["Exam Appearance Status", "Cycle"]] = ["Absent", "-"]
+    data.loc[absent, ["Total Marks", "Evaluated By", "Evaluator Id"]] = np.nan
+
+    # Any other cycle makes the whole file an "unusual cycle" skip
+    if unusual_cycles:
+        unusual = rng.choice(np.flatnonzero(~absent), size=min(unusual_cycles, int((~absent).sum())), replace=False)
+        data.loc[unusual, "Cycle"] = "secondary"
+
+    return data[REQUIRED_COLUMNS]
+
+
+def write_export(data, output_path):
+    output_format = detect_input_format(output_path)
+    if output_format == "csv":
+        data.to_csv(output_path, index=False)
+    elif output_format == "parquet":
+        data.to_parquet(output_path, index=False)
+    else:
+        data.to_excel(output_path, index=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("output")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--evaluators", type=int, default=200)
+    parser.add_argument("--skew", type=float, default=1.0, help="0 spreads scripts evenly across evaluators")
+    parser.add_argument("--marks", choices=MARK_DISTRIBUTIONS, default="normal")
+    parser.add_argument("--max-marks", type=int, default=100)
+    parser.add_argument("--non-primary", type=float, default=0.02, help="fraction of absent rows with cycle '-'")
+    parser.add_argument("--unusual-cycles", type=int, default=0, help="rows with a cycle the tool rejects")
+    parser.add_argument("--schedules", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    data = generate_export(
+        args.rows,
+        evaluators=args.evaluators,
+        skew=args.skew,
+        marks=args.marks,
+        max_marks=args.max_marks,
+        non_primary=args.non_primary,
+        unusual_cycles=args.unusual_cycles,
+        schedules=args.schedules,
+        seed=args.seed
+    )
+    write_export(data, args.output)
+    print(f"Wrote {len(data)} rows to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+import os
+import json
+import sys
+
+APP_NAME = "Moderator Tool"
+CONFIG_FILENAME = "user_config.json"
+
+def get_config_path():
+    if sys.platform == "win32":
+        appdata = os.environ.get("LOCALAPPDATA", os.path.expanduser("~\\AppData\\Local"))
+        folder = os.path.join(appdata, APP_NAME)
+    elif sys.platform == "darwin":
+        folder = os.path.join(os.path.expanduser("~/Library/Application Support/"), APP_NAME)
+    else:
+        folder = os.path.join(os.path.expanduser("~/.config/"), APP_NAME)
+    os.makedirs(folder, exist_ok=True)
+    return os.path.join(folder, CONFIG_FILENAME)
+
+CONFIG_FILE = get_config_path()
+
+# Parsed input frames are cached beside the config so repeat runs skip the Excel parse
+CACHE_DIR = os.path.join(os.path.dirname(CONFIG_FILE), "cache")
+
+# CONFIG_FILE = "user_config.json"
+
+default_config = {
+    "top_booklet": 20,
+    "middle_booklet": 40,
+    "bottom_booklet": 40,
+    "top_pick": 5,
+    "middle_pick": 10,
+    "bottom_pick": 5,
+    "individual_toggle": True,
+    "bulk_toggle": True,
+    "sampling_seed": 42,
+    # None picks a fresh moderator mapping on every run; an integer repeats it
+    "moderator_seed": None,
+    "max_workers": 0,
+    "excel_read_engine": "auto",
+    "excel_write_engine": "auto",
+    "output_format": "xlsx",
+    # "all" keeps every exported column for MasterAllocationData; "required" parses
+    # only the columns the allocation needs, which is faster on large exports
+    "input_columns": "all",
+    # MasterAllocationData: "full", "selected" rows only, or "none"; an empty
+    # column list keeps every column
+    "master_sheet": "full",
+    "master_sheet_columns": [],
+    "cache_max_mb": 256,
+    # Adds tracemalloc peaks to the run report, at some cost in speed
+    "trace_memory": False,
+    # Treat every Schedule Id in a consolidated export as its own file
+    "split_by_schedule": False
+}
+
+def load_config(config_file=CONFIG_FILE):
+    if os.path.exists(config_file):
+        try:
+            with open(config_file, "r") as f:
+                config = json.load(f)
+                # Merge loaded config with default_config to ensure keys
+                return {**default_config, **config}
+        except Exception as e:
+            print(f"Failed to load config: {e}")
+    return default_config.copy()
+
+def save_config(config):
+    try:
+        with open(CONFIG_FILE, "w") as f:
+            json.dump(config, f, indent=4)
+        print("Config saved.")
+    except Exception as e:
+        print(f"Failed to save config: {e}")
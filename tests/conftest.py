@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The app runs as loose modules from the repo root, and the original loops the
+# engine is checked against live in benchmarks/
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "benchmarks")]
@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+
+from allocation_engine import (
+    StageTimer,
+    allocate_categorized,
+    build_moderator_mapping,
+    categorize_allocation,
+    get_allocation_settings,
+    get_booklet_split,
+    get_io_settings,
+)
+from moderator_config import default_config
+from synthetic_export import generate_export
+
+# Evaluator ids are plain integers here; the mapping only needs them hashable
+POOL_SIZES = range(2, 3001)
+
+
+def assert_derangement(evaluator_pool, moderator_mapping):
+    assert sorted(moderator_mapping) == evaluator_pool
+    assert sorted(moderator_mapping.values()) == evaluator_pool
+    assert all(evaluator != moderator for evaluator, moderator in moderator_mapping.items())
+
+
+@pytest.mark.parametrize("seed", [None, 0, 2024])
+def test_every_pool_size_gets_a_derangement(seed):
+    for size in POOL_SIZES:
+        evaluator_pool = list(range(size))
+        assert_derangement(evaluator_pool, build_moderator_mapping(evaluator_pool, seed))
+
+
+def test_same_seed_repeats_the_mapping():
+    for size in POOL_SIZES:
+        evaluator_pool = list(range(size))
+        assert build_moderator_mapping(evaluator_pool, size) == build_moderator_mapping(evaluator_pool, size)
+
+
+def test_fewer_than_two_evaluators_get_no_mapping():
+    assert build_moderator_mapping([]) == {}
+    assert build_moderator_mapping(["evaluator0@example.com"]) == {}
+
+
+@pytest.mark.parametrize("seed", [None, 0, 2024])
+def test_missing_evaluators_are_left_out(seed):
+    for size in range(2, 200):
+        evaluator_pool = list(range(size))
+        moderator_mapping = build_moderator_mapping(evaluator_pool + [np.nan, None], seed)
+        assert_derangement(evaluator_pool, moderator_mapping)
+
+
+def allocate(data, seed=0):
+    allocation_settings = {**get_allocation_settings(default_config), "moderator_seed": seed}
+    io_settings = get_io_settings(default_config, individual_files=False)
+    invalid_cycles, sorted_data = categorize_allocation(data, *get_booklet_split(allocation_settings))
+    assert not invalid_cycles
+    return allocate_categorized("export.xlsx", sorted_data, allocation_settings, io_settings, StageTimer())
+
+
+def test_rows_without_an_evaluator_leave_every_selection_moderated():
+    data = generate_export(2_000, evaluators=3, non_primary=0, seed=1)
+    data.loc[data.index[::50], "Evaluated By"] = np.nan
+
+    result = allocate(data)
+
+    assert result["status"] == "processed"
+    assert result["bulk_allocation_df"]["Evaluator Ids"].notna().all()
+
+
+def test_one_evaluator_with_blank_rows_is_still_a_single_evaluator():
+    data = generate_export(200, evaluators=1, non_primary=0, seed=1)
+    data.loc[data.index[::10], "Evaluated By"] = np.nan
+
+    result = allocate(data)
+
+    assert result["status"] == "single_evaluator"
+    assert result["sole_evaluator"] == "evaluator0@example.com"
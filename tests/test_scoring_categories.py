@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from allocation_engine import assign_scoring_categories, filter_primary_rows, sort_by_evaluator
+from reference_allocation import reference_categorize
+
+
+def random_frame(rng):
+    rows = int(rng.integers(1, 400))
+    evaluators = int(rng.integers(1, 30))
+    # Half marks on a short scale leave plenty of ties inside each evaluator
+    return pd.DataFrame({
+        'Evaluated By': rng.choice([f'evaluator{i}@example.com' for i in range(evaluators)], rows),
+        'Total Marks': rng.integers(0, 41, rows) / 2,
+        'Script Id': rng.permutation(rows) + 1,
+        'Cycle': rng.choice(['primary', 'primary', 'primary', '-'], rows),
+    })
+
+
+def random_split(rng, min_bottom):
+    top = int(rng.integers(0, 101 - min_bottom))
+    bottom = int(rng.integers(min_bottom, 101 - top))
+    return top, 100 - top - bottom, bottom
+
+
+def categorize(data, booklet_split):
+    return assign_scoring_categories(sort_by_evaluator(filter_primary_rows(data)), *booklet_split)
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_matches_reference_loop(seed):
+    rng = np.random.default_rng(seed)
+    data = random_frame(rng)
+    booklet_split = random_split(rng, min_bottom=1)
+
+    expected = reference_categorize(data, *booklet_split)
+    actual = categorize(data, booklet_split)
+
+    np.testing.assert_array_equal(actual['Script Id'].to_numpy(), expected['Script Id'].to_numpy())
+    np.testing.assert_array_equal(actual['Scoring Category'].astype(object).to_numpy(), expected['Scoring Category'].to_numpy())
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_zero_bottom_keeps_top_rows_in_top(seed):
+    # The loop's index[-0:] slice covered every row, so with a 0% bottom slice it
+    # left the top rows labelled 'Bottom 0%'. They are labelled Top now; every
+    # other row is categorised as before.
+    rng = np.random.default_rng(seed)
+    data = random_frame(rng)
+    top = int(rng.integers(0, 101))
+    booklet_split = (top, 100 - top, 0)
+
+    expected = reference_categorize(data, *booklet_split)['Scoring Category'].replace('Bottom 0%', f'Top {top}%')
+    actual = categorize(data, booklet_split)['Scoring Category'].astype(object)
+
+    assert 'Bottom 0%' not in set(actual)
+    np.testing.assert_array_equal(actual.to_numpy(), expected.to_numpy())